@@ -0,0 +1,401 @@
+"""效能量測工具
+
+    python benchmark.py rules [--items 50000]    規則判定吞吐量 (各 profile 每秒可判定的項目名稱數)
+    python benchmark.py rules-diff [--items 50000]
+                                                 編譯規則與 v63.43 逐詞判定 (legacy_rules.py) 的差異比對，任一項目名稱結果不同即失敗
+    python benchmark.py corpus [--baseline bench_baseline.json [--update]] [--update-expected]
+                                                 合成報告語料：各檔 / 各引擎 / 每頁耗時與記憶體峰值，可與基準比對；
+                                                 各檔結果須與 corpus_expected.json 相同 (與機器無關，隨版本控制)
+    python benchmark.py memory [--pages 10 30] [--ceiling-mb 40]
+                                                 長報告記憶體上限檢查：峰值須低於上限且不隨頁數成長 (串流模式)
+    python benchmark.py backend [PDF ...]        純文字後端差異比對：pdfminer 與 pdfium 的單檔結果須相同，並比較耗時
+                                                 (未指定檔案時使用合成報告語料；切換 REPORT_TEXT_BACKEND 前請對實際報告執行)
+    python benchmark.py artifacts [PDF ...]      版面中間檔：直接解析與經由中間檔解析的結果須相同，並比較重新評估的耗時
+
+基準檔與機器相關，請在同一台機器上建立與比對；任一指標比基準慢 (或記憶體多) 超過 --threshold 即標示並以結束代碼 1 結束
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pdfplumber
+
+import core
+import legacy_rules
+import synthetic_reports
+
+
+def build_item_names(count, seed=0):
+    """以規則檔內的關鍵字、排除詞加上常見雜訊組出測試用的項目名稱 (固定亂數種子，結果可重現)"""
+    rng = random.Random(seed)
+    terms = []
+    for analyte in core.RULES["analytes"].values():
+        terms.extend(analyte["include"])
+    for words in core.RULES["term_sets"].values():
+        terms.extend(words)
+    noise = ["(CAS No. 117-81-7)", "mg/kg", "Sum of", "Test Item(s)", "Sample", "IEC 62321-6:2015",
+             "Hexabromocyclododecane", "Tetrabromobisphenol A", "PVC", "Result No.1", "N.D.", "related substances"]
+    names = []
+    for _ in range(count):
+        parts = rng.sample(terms, rng.randint(1, 2)) + rng.sample(noise, rng.randint(0, 2))
+        rng.shuffle(parts)
+        names.append(" ".join(parts).lower())
+    return names
+
+
+def bench_rules(count):
+    names = build_item_names(count)
+    profiles = [p for p in core.ANALYTE_RULES.profiles if p not in ("sgs_base", "malaysia")]
+    print(f"規則判定吞吐量：{count} 個項目名稱")
+    print(f"{'profile':<16}{'items/s':>12}{'µs/item':>10}{'hit%':>8}")
+
+    # 參考：逐詞子字串掃描 (舊版巢狀迴圈的成本下限)
+    all_terms = sorted({t.lower() for p in core.ANALYTE_RULES.profiles.values() for t in p["terms"]})
+    start = time.perf_counter()
+    for name in names:
+        [t for t in all_terms if t in name]
+    elapsed = time.perf_counter() - start
+    print(f"{'(naive scan)':<16}{count / elapsed:>12,.0f}{elapsed / count * 1e6:>10.2f}{'-':>8}")
+
+    for profile in profiles:
+        start = time.perf_counter()
+        matched = 0
+        for name in names:
+            simple, group = core.ANALYTE_RULES.classify(name, profile)
+            if simple or group: matched += 1
+        elapsed = time.perf_counter() - start
+        print(f"{profile:<16}{count / elapsed:>12,.0f}{elapsed / count * 1e6:>10.2f}{matched / count:>8.0%}")
+
+
+def diff_item_names(count, seed=0):
+    """差異比對用的項目名稱：每個關鍵字單獨出現、每個關鍵字搭配每個排除/覆寫/略過詞，再加上隨機組合"""
+    keywords = {kw.lower() for table in (legacy_rules.SIMPLE_KEYWORDS, legacy_rules.GROUP_KEYWORDS) for kws in table.values() for kw in kws}
+    keywords |= {t for prof in core.ANALYTE_RULES.profiles.values() for t in prof["index"]}
+    modifiers = set(legacy_rules.MSDS_HEADER_KEYWORDS + legacy_rules.BROMO_COMPOUNDS + legacy_rules.FLUORO_COMPOUNDS
+                    + legacy_rules.BROMINATED_FLAME_RETARDANTS)
+    modifiers |= {"hbcdd", "cyclododecane", "ecd", "indeno", "tbbp", "tetrabromo", "halogen", "bromine", "related",
+                  "pvc", "polyvinyl", "test item", "fluorine", "chlorine", "iodine", "lodine"}
+    for prof in core.ANALYTE_RULES.profiles.values():
+        modifiers |= prof["skip"] | prof["veto_simple"]
+        for group in (prof["exclude"], prof["override"]):
+            for terms in group.values(): modifiers |= terms
+    keywords, modifiers = sorted(keywords), sorted(m.lower() for m in modifiers)
+    names = keywords + [f"{kw} {m}" for kw in keywords for m in modifiers] + [f"{m} ({kw})" for kw in keywords for m in modifiers]
+    return names + build_item_names(count, seed)
+
+
+def check_rules_diff(count, seed=0):
+    """編譯規則 (ANALYTE_RULES.classify) 與凍結的舊版逐詞判定逐項比對；text profile 另以隨機 targets 比對"""
+    rng = random.Random(seed)
+    names = diff_item_names(count, seed)
+    keys = list(legacy_rules.SIMPLE_KEYWORDS) + list(legacy_rules.GROUP_KEYWORDS)
+    failures = 0
+    for profile, legacy in legacy_rules.PROFILES.items():
+        mismatched = 0
+        for name in names:
+            cases = [(None,)]
+            if profile == "text": cases.append((set(rng.sample(keys, rng.randint(1, len(keys)))),))
+            for (targets,) in cases:
+                expected = legacy(name, targets) if profile == "text" else legacy(name)
+                actual = core.ANALYTE_RULES.classify(name, profile, targets)
+                if (list(actual[0]), list(actual[1])) == (list(expected[0]), list(expected[1])): continue
+                mismatched += 1
+                if mismatched <= 5: print(f"⚠ {profile}: {name!r} targets={targets} 舊版 {expected} / 規則檔 {actual}")
+        print(f"{profile:<16}{len(names)} 個項目名稱，{mismatched} 個不同")
+        failures += mismatched
+    print("與舊版判定相同" if not failures else f"共 {failures} 個不同")
+    return 1 if failures else 0
+
+
+def as_upload(name, data):
+    buf = io.BytesIO(data)
+    buf.name = name
+    return buf
+
+
+def best_of(repeat, fn):
+    """重複執行取最短耗時 (ms)，較平均值不受背景負載干擾"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def peak_kb(fn):
+    """tracemalloc 記錄的 Python 配置峰值 (KB)；量測時執行較慢，因此與計時分開跑"""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def run_engine_only(name, data):
+    """只計引擎本身 (含其頁面解析)，不含開檔、掃描檔判定與路由"""
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        doc = core.PageCache(pdf)
+        if core.is_scanned_pdf(doc): return 0.0
+        engine, company = core.route_engine(doc.text(0).upper())
+        start = time.perf_counter()
+        core.run_engine(engine, doc, name, company)
+        return (time.perf_counter() - start) * 1000
+
+
+CORPUS_EXPECTED = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus_expected.json")
+
+
+def corpus_output(status, payload):
+    """單檔結果的可比對形式：狀態 + 日期 / 公司 / 引擎 / 各分析物數值 (不含分數與 datetime)"""
+    if isinstance(payload, core.FileRecord):
+        payload = {k: v for k, v in payload.to_dict().items() if k != "DateObj" and not k.endswith("_score")}
+    return {"status": status, "result": payload}
+
+
+def check_expected(outputs, update):
+    """與 corpus_expected.json 逐檔比對，回傳標示清單；update 時以本次結果覆寫"""
+    if update:
+        with open(CORPUS_EXPECTED, "w", encoding="utf-8", newline="\r\n") as fh:
+            json.dump(outputs, fh, ensure_ascii=False, indent=1, sort_keys=True)
+            fh.write("\n")
+        print(f"已寫入預期結果：{CORPUS_EXPECTED}")
+        return []
+    with open(CORPUS_EXPECTED, encoding="utf-8") as fh:
+        expected = json.load(fh)
+    flags = []
+    for name, output in outputs.items():
+        if name not in expected:
+            flags.append(f"{name}: 預期結果中沒有此檔")
+            continue
+        want = expected[name]
+        if output == want: continue
+        if output["status"] != want["status"] or not isinstance(want["result"], dict):
+            flags.append(f"{name}: {want['status']} -> {output['status']}")
+            continue
+        diffs = [f"{k} {want['result'].get(k)!r} -> {v!r}" for k, v in output["result"].items() if want["result"].get(k) != v]
+        flags.append(f"{name}: " + "，".join(diffs))
+    return flags
+
+
+def result_digest(payload):
+    if isinstance(payload, core.FileRecord): payload = payload.to_dict()
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:12]
+
+
+def bench_corpus(repeat, long_pages):
+    samples = synthetic_reports.corpus(long_pages)
+    report = {"python": platform.python_version(), "pdfplumber": pdfplumber.__version__, "files": {}, "batch": {}}
+    outputs = {}
+    print(f"{'file':<20}{'engine':<10}{'pages':>6}{'file ms':>10}{'engine ms':>11}{'ms/page':>9}{'peak KB':>10}")
+    for name, data in samples.items():
+        status, payload, _ = core.parse_pdf_file(name, data)
+        with pdfplumber.open(io.BytesIO(data)) as pdf: pages = len(pdf.pages)
+        file_ms = best_of(repeat, lambda: core.parse_pdf_file(name, data))
+        engine_ms = min(run_engine_only(name, data) for _ in range(repeat))
+        row = {
+            "engine": payload.get("Engine", "") if status == "ok" else status,
+            "pages": pages,
+            "file_ms": round(file_ms, 1),
+            "engine_ms": round(engine_ms, 1),
+            "peak_kb": round(peak_kb(lambda: core.parse_pdf_file(name, data))),
+            "result": result_digest(payload)
+        }
+        report["files"][name] = row
+        outputs[name] = corpus_output(status, payload)
+        print(f"{name:<20}{row['engine']:<10}{pages:>6}{file_ms:>10.1f}{engine_ms:>11.1f}{file_ms / pages:>9.1f}{row['peak_kb']:>10}")
+
+    def batch():
+        return core.process_batch([as_upload(n, d) for n, d in samples.items()], 1)
+    row, unreadable = batch()
+    report["batch"] = {
+        "files": len(samples),
+        "batch_ms": round(best_of(repeat, batch), 1),
+        "peak_kb": round(peak_kb(batch)),
+        "result": result_digest([row, unreadable])
+    }
+    print(f"process_batch ({len(samples)} 檔): {report['batch']['batch_ms']:.1f} ms, 峰值 {report['batch']['peak_kb']} KB")
+    return report, outputs
+
+
+def compare_baseline(report, baseline, threshold):
+    """回傳標示清單 (耗時 / 記憶體超過門檻、輸出與基準不同)"""
+    flags = []
+    pairs = [(f"file {n}", row, baseline["files"].get(n)) for n, row in report["files"].items()]
+    pairs.append(("process_batch", report["batch"], baseline.get("batch")))
+    for label, row, base in pairs:
+        if not base:
+            flags.append(f"{label}: 基準中沒有此項")
+            continue
+        for metric in ("file_ms", "engine_ms", "batch_ms", "peak_kb"):
+            if metric not in row or not base.get(metric): continue
+            ratio = row[metric] / base[metric]
+            if ratio > 1 + threshold:
+                flags.append(f"{label}: {metric} {base[metric]} -> {row[metric]} ({ratio - 1:+.0%})")
+        if row["result"] != base["result"]:
+            flags.append(f"{label}: 輸出與基準不同")
+    return flags
+
+
+MEMORY_SAMPLES = {
+    "STANDARD": lambda n: synthetic_reports.sgs_standard(extra_pages=n),
+    "CTI": lambda n: synthetic_reports.cti(extra_pages=n),
+    "INTERTEK": lambda n: synthetic_reports.intertek(extra_pages=n),
+}
+
+
+def check_memory(page_counts, ceiling_mb, growth):
+    """各引擎在不同頁數下解析一份報告的記憶體峰值；超過上限或最大頁數的峰值超過最小頁數的 growth 倍即失敗"""
+    failures = []
+    print(f"{'engine':<10}" + "".join(f"{f'{n}p MB':>10}" for n in page_counts))
+    for engine, build in MEMORY_SAMPLES.items():
+        peaks = []
+        for n in page_counts:
+            data = build(n)
+            peaks.append(peak_kb(lambda: core.parse_pdf_file(f"{engine}.pdf", data)) / 1024)
+        print(f"{engine:<10}" + "".join(f"{p:>10.1f}" for p in peaks))
+        if max(peaks) > ceiling_mb:
+            failures.append(f"{engine}: 峰值 {max(peaks):.1f} MB 超過上限 {ceiling_mb} MB")
+        if peaks[-1] > peaks[0] * growth:
+            failures.append(f"{engine}: {page_counts[-1]} 頁峰值為 {page_counts[0]} 頁的 {peaks[-1] / peaks[0]:.1f} 倍")
+    for failure in failures: print(f"⚠ {failure}")
+    print("記憶體檢查通過" if not failures else "記憶體檢查失敗")
+    return 1 if failures else 0
+
+
+def parse_with_backend(backend, name, data):
+    saved = core.TEXT_BACKEND
+    core.TEXT_BACKEND = backend
+    try:
+        return core.parse_pdf_file(name, data)
+    finally:
+        core.TEXT_BACKEND = saved
+
+
+def compare_backends(paths, repeat):
+    """兩種純文字後端的單檔結果 (不含 File Name 以外的計數) 須完全相同；回傳結束代碼"""
+    if paths:
+        samples = {}
+        for path in paths:
+            with open(path, "rb") as fh: samples[os.path.basename(path)] = fh.read()
+    else:
+        samples = synthetic_reports.corpus(20)
+    diffs = []
+    totals = {"pdfminer": 0.0, "pdfium": 0.0}
+    print(f"{'file':<24}{'engine':<10}{'pdfminer ms':>13}{'pdfium ms':>11}{'speedup':>9}  result")
+    for name, data in samples.items():
+        outcomes = {b: parse_with_backend(b, name, data) for b in totals}
+        ms = {b: best_of(repeat, lambda b=b: parse_with_backend(b, name, data)) for b in totals}
+        for b in totals: totals[b] += ms[b]
+        (status_a, payload_a, _), (status_b, payload_b, _) = outcomes["pdfminer"], outcomes["pdfium"]
+        same = (status_a, payload_a) == (status_b, payload_b)
+        if not same:
+            keys = sorted(set(payload_a.to_dict()) | set(payload_b.to_dict())) if status_a == status_b == "ok" else ["status"]
+            changed = [k for k in keys if status_a != status_b or payload_a.get(k) != payload_b.get(k)]
+            diffs.append((name, changed))
+        engine = payload_a.get("Engine", "") if status_a == "ok" else status_a
+        print(f"{name:<24}{engine:<10}{ms['pdfminer']:>13.1f}{ms['pdfium']:>11.1f}{ms['pdfminer'] / ms['pdfium']:>8.2f}x  "
+              + ("相同" if same else "不同"))
+    print(f"合計：pdfminer {totals['pdfminer']:.0f} ms，pdfium {totals['pdfium']:.0f} ms ({totals['pdfminer'] / totals['pdfium']:.2f}x)")
+    for name, changed in diffs: print(f"⚠ {name}: {', '.join(changed)} 不同")
+    print("兩種後端結果相同" if not diffs else f"{len(diffs)} 個檔案結果不同，請勿切換為 pdfium")
+    return 1 if diffs else 0
+
+
+def compare_artifacts(paths, repeat):
+    """直接解析與經由中間檔 (建立後再讀取) 的單檔結果須相同；回傳結束代碼"""
+    if paths:
+        samples = {}
+        for path in paths:
+            with open(path, "rb") as fh: samples[os.path.basename(path)] = fh.read()
+    else:
+        samples = synthetic_reports.corpus(20)
+    diffs = []
+    totals = {"pdf": 0.0, "build": 0.0, "artifact": 0.0}
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'file':<24}{'pdf ms':>10}{'build ms':>10}{'artifact ms':>13}{'KB':>8}  result")
+        for name, data in samples.items():
+            start = time.perf_counter()
+            core.parse_artifact(name, data, directory=directory)
+            build_ms = (time.perf_counter() - start) * 1000
+            ms = {"pdf": best_of(repeat, lambda: core.parse_pdf_file(name, data)), "build": build_ms,
+                  "artifact": best_of(repeat, lambda: core.parse_artifact(name, data, directory=directory))}
+            for k in totals: totals[k] += ms[k]
+            same = all(core.parse_artifact(name, data, early, directory)[:2] == core.parse_pdf_file(name, data, early)[:2]
+                       for early in (False, True))
+            if not same: diffs.append(name)
+            size = os.path.getsize(core.artifact_path(data, directory)) / 1024
+            print(f"{name:<24}{ms['pdf']:>10.1f}{ms['build']:>10.1f}{ms['artifact']:>13.2f}{size:>8.1f}  " + ("相同" if same else "不同"))
+    print(f"合計：直接解析 {totals['pdf']:.0f} ms，建立中間檔 {totals['build']:.0f} ms，由中間檔重新評估 {totals['artifact']:.1f} ms"
+          f" ({totals['pdf'] / totals['artifact']:.0f}x)")
+    for name in diffs: print(f"⚠ {name}: 經由中間檔的結果不同")
+    print("中間檔結果相同" if not diffs else f"{len(diffs)} 個檔案結果不同")
+    return 1 if diffs else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="報告聚合工具效能量測")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_rules = sub.add_parser("rules", help="規則判定吞吐量")
+    p_rules.add_argument("--items", type=int, default=50000, help="測試項目名稱數量")
+    p_rules_diff = sub.add_parser("rules-diff", help="編譯規則與舊版逐詞判定的差異比對")
+    p_rules_diff.add_argument("--items", type=int, default=50000, help="隨機項目名稱數量 (另含每個關鍵字與排除詞的組合)")
+    p_corpus = sub.add_parser("corpus", help="合成報告語料的解析耗時與記憶體")
+    p_corpus.add_argument("--repeat", type=int, default=3, help="每項重複次數 (取最短)")
+    p_corpus.add_argument("--long-pages", type=int, default=20, help="長報告的免責聲明頁數 (0 = 不產生)")
+    p_corpus.add_argument("--baseline", help="基準 JSON 檔路徑")
+    p_corpus.add_argument("--update", action="store_true", help="以本次結果覆寫基準檔")
+    p_corpus.add_argument("--threshold", type=float, default=0.25, help="判定退化的比例門檻 (0.25 = 慢 25%%)")
+    p_corpus.add_argument("--update-expected", action="store_true", help="以本次各檔結果覆寫 corpus_expected.json (確認行為變更後才使用)")
+    p_memory = sub.add_parser("memory", help="長報告記憶體上限檢查")
+    p_memory.add_argument("--pages", type=int, nargs="+", default=[10, 30], help="免責聲明頁數 (由小到大)")
+    p_memory.add_argument("--ceiling-mb", type=float, default=40, help="單檔解析的記憶體峰值上限 (MB)")
+    p_memory.add_argument("--growth", type=float, default=1.5, help="最大頁數峰值相對最小頁數的容許倍數")
+    p_backend = sub.add_parser("backend", help="純文字後端 (pdfminer / pdfium) 差異比對與耗時")
+    p_backend.add_argument("paths", nargs="*", help="要比對的 PDF (預設為合成報告語料)")
+    p_backend.add_argument("--repeat", type=int, default=3, help="每項重複次數 (取最短)")
+    p_artifacts = sub.add_parser("artifacts", help="版面中間檔差異比對與重新評估耗時")
+    p_artifacts.add_argument("paths", nargs="*", help="要比對的 PDF (預設為合成報告語料)")
+    p_artifacts.add_argument("--repeat", type=int, default=3, help="每項重複次數 (取最短)")
+    args = parser.parse_args()
+    if args.command == "rules-diff":
+        return check_rules_diff(args.items)
+    if args.command == "artifacts":
+        return compare_artifacts(args.paths, args.repeat)
+    if args.command == "backend":
+        return compare_backends(args.paths, args.repeat)
+    if args.command == "memory":
+        return check_memory(sorted(args.pages), args.ceiling_mb, args.growth)
+    if args.command == "rules":
+        bench_rules(args.items)
+    elif args.command == "corpus":
+        report, outputs = bench_corpus(args.repeat, args.long_pages)
+        mismatches = check_expected(outputs, args.update_expected)
+        for flag in mismatches: print(f"⚠ {flag}")
+        print("各檔結果與預期相同" if not mismatches else f"{len(mismatches)} 檔結果與預期不同")
+        if not args.baseline: return 1 if mismatches else 0
+        if args.update or not os.path.exists(args.baseline):
+            with open(args.baseline, "w", encoding="utf-8") as fh:
+                json.dump(report, fh, ensure_ascii=False, indent=1)
+            print(f"已寫入基準：{args.baseline}")
+            return 1 if mismatches else 0
+        with open(args.baseline, encoding="utf-8") as fh:
+            flags = compare_baseline(report, json.load(fh), args.threshold)
+        for flag in flags: print(f"⚠ {flag}")
+        print("與基準相符" if not flags else f"{len(flags)} 項超出門檻 ({args.threshold:.0%})")
+        return 1 if flags or mismatches else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
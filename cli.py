@@ -0,0 +1,270 @@
+"""命令列批次模式 (不啟動 Streamlit 頁面，供大量歷史報告重新整合)
+
+    python cli.py 報告根目錄 -o summary.xlsx              每個子目錄 (內含 PDF) 為一個 ITEM
+    python cli.py --manifest items.json -o summary.csv     清單中每個項目為一個 ITEM (亦可輸出 .parquet)
+
+manifest 格式：JSON 陣列，元素可為目錄路徑、PDF 路徑陣列，或 {"name": 名稱, "files": [路徑...]}；相對路徑以清單所在目錄為準
+輸出欄位與網頁版 Excel 相同，另加 Source (子目錄 / 清單項目名稱)；各 ITEM 平行處理，依 ITEM 順序邊完成邊寫出
+--timeout / --max-memory-mb 設定單檔資源上限，超過的檔案略過並列於摘要 (不影響結束代碼)
+--artifacts 目錄：保存 / 重用各 PDF 的版面中間檔 (見 core.ARTIFACT_DIR)；調整規則後重跑只需讀取中間檔，不再開啟 PDF
+--dedupe-reports：報告編號相同的檔案只解析第一份 (內容完全相同的檔案一律只解析一次)；重複檔與跨 ITEM 重複的檔案列於摘要
+--history 資料庫：各 ITEM 的整合列與單檔結果寫入 SQLite 歷史資料庫 (見 core.ResultStore)，Source 記為 ITEM 名稱
+結束代碼：0 = 全部完成，1 = 有檔案解析失敗，2 = 參數或輸入錯誤
+"""
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import core
+
+OUTPUT_COLUMNS = core.DISPLAY_COLUMNS + ["Source"]
+
+
+def list_pdfs(directory):
+    return [os.path.join(directory, n) for n in sorted(os.listdir(directory)) if n.lower().endswith(".pdf")]
+
+
+def discover_items(root):
+    """根目錄下每個含 PDF 的子目錄為一個 ITEM (依名稱排序)"""
+    items = []
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name)
+        if os.path.isdir(path):
+            files = list_pdfs(path)
+            if files: items.append((name, files))
+    return items
+
+
+def load_manifest(path):
+    with open(path, encoding="utf-8") as fh:
+        entries = json.load(fh)
+    base = os.path.dirname(os.path.abspath(path))
+    items = []
+    for n, entry in enumerate(entries, 1):
+        if isinstance(entry, str):
+            directory = os.path.join(base, entry)
+            items.append((entry, list_pdfs(directory)))
+        elif isinstance(entry, list):
+            items.append((f"item{n}", [os.path.join(base, p) for p in entry]))
+        else:
+            items.append((entry.get("name", f"item{n}"), [os.path.join(base, p) for p in entry["files"]]))
+    return items
+
+
+def run_item(index, name, paths, early_exit, use_cache, timeout=None, memory_mb=None, dedupe_reports=False):
+    """在子行程中處理單一 ITEM，回傳可序列化的摘要
+    use_cache: False 或 core.cache_versions() 的結果 (由父行程計算一次，各 ITEM 不再重新計算快取版本)
+    """
+    start = time.perf_counter()
+    files = []
+    errors = []
+    skipped = []
+    duplicates = []
+    for path in paths:
+        try:
+            with open(path, "rb") as fh:
+                buf = io.BytesIO(fh.read())
+        except OSError as e:
+            errors.append((os.path.basename(path), str(e)))
+            continue
+        buf.name = os.path.basename(path)
+        files.append(buf)
+    row, unreadable, records = None, [], []
+    if files:
+        cache = core.ResultCache(versions=use_cache) if use_cache else None
+        outcomes = []
+        row, unreadable = core.process_batch(files, index, cache=cache, early_exit=early_exit, errors=errors,
+                                            timeout=timeout, memory_mb=memory_mb, skipped=skipped, outcomes=outcomes,
+                                            duplicates=duplicates, dedupe_reports=dedupe_reports)
+        records = core.history_records([f.name for f in files], [hashlib.sha256(f.getvalue()).hexdigest() for f in files],
+                                      outcomes)
+    return {"index": index, "name": name, "row": row, "unreadable": unreadable, "errors": errors, "skipped": skipped,
+            "duplicates": duplicates, "records": records, "files": len(paths), "seconds": time.perf_counter() - start}
+
+
+class CsvSink:
+    def __init__(self, path):
+        self.fh = open(path, "w", newline="", encoding="utf-8-sig")
+        self.writer = csv.writer(self.fh)
+        self.writer.writerow(OUTPUT_COLUMNS)
+
+    def write(self, row):
+        self.writer.writerow([row.get(c, "") for c in OUTPUT_COLUMNS])
+        self.fh.flush()
+
+    def close(self):
+        self.fh.close()
+
+
+class XlsxSink:
+    """openpyxl 唯寫模式：逐列寫入暫存檔，不在記憶體保留整張工作表"""
+    def __init__(self, path):
+        from openpyxl import Workbook
+        self.path = path
+        self.wb = Workbook(write_only=True)
+        self.ws = self.wb.create_sheet("Summary")
+        self.ws.append(OUTPUT_COLUMNS)
+
+    def write(self, row):
+        self.ws.append([row.get(c, "") for c in OUTPUT_COLUMNS])
+
+    def close(self):
+        self.wb.save(self.path)
+
+
+class ParquetSink:
+    """Parquet 需整欄寫出：先累積各列，結束時一次寫檔 (數值欄含 N.D. 等文字，一律存為字串)"""
+    def __init__(self, path):
+        self.path = path
+        self.rows = []
+
+    def write(self, row):
+        self.rows.append(row)
+
+    def close(self):
+        import pandas as pd
+        df = pd.DataFrame([[row.get(c, "") for c in OUTPUT_COLUMNS] for row in self.rows], columns=OUTPUT_COLUMNS)
+        df = df.astype({c: str for c in OUTPUT_COLUMNS if c != "ITEM"})
+        df.to_parquet(self.path, index=False)
+
+
+SINKS = {".csv": CsvSink, ".xlsx": XlsxSink, ".parquet": ParquetSink}
+
+
+def run(items, sink, jobs=1, early_exit=False, use_cache=True, log=sys.stderr, timeout=None, memory_mb=None, store=None,
+        dedupe_reports=False):
+    """處理所有 ITEM，依 ITEM 順序寫出整合列；回傳各 ITEM 的摘要 (依 ITEM 順序)
+    store: core.ResultStore，各 ITEM 完成時 (依 ITEM 順序) 一併寫入歷史資料庫
+    """
+    done = {}
+    next_index = 1
+
+    def flush():
+        nonlocal next_index
+        while next_index in done:
+            result = done[next_index]
+            if result["row"]:
+                sink.write({**result["row"], "Source": result["name"]})
+            if store is not None and (result["row"] or result["records"]):
+                store.add_item(result["row"], result["records"], source=result["name"])
+            print(f"[{next_index}/{len(items)}] {result['name']}: {result['files']} 檔, {result['seconds']:.1f}s"
+                  + (f", 無法讀取 {len(result['unreadable'])}" if result["unreadable"] else "")
+                  + (f", 失敗 {len(result['errors'])}" if result["errors"] else "")
+                  + (f", 略過 {len(result['skipped'])}" if result["skipped"] else "")
+                  + (f", 重複 {len(result['duplicates'])}" if result["duplicates"] else ""), file=log)
+            next_index += 1
+
+    versions = core.cache_versions() if use_cache else False
+    args = [(index, name, paths, early_exit, versions, timeout, memory_mb, dedupe_reports) for index, (name, paths) in enumerate(items, 1)]
+    if jobs > 1 and len(items) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(items))) as pool:
+            futures = {pool.submit(run_item, *a): a for a in args}
+            for future in futures:
+                index, name, paths = futures[future][:3]
+                try:
+                    done[index] = future.result()
+                except Exception as e: # 子行程異常終止：整個 ITEM 記為失敗
+                    done[index] = {"index": index, "name": name, "row": None, "unreadable": [], "skipped": [], "duplicates": [], "records": [],
+                                   "errors": [(name, repr(e))], "files": len(paths), "seconds": 0.0}
+                flush()
+    else:
+        for a in args:
+            done[a[0]] = run_item(*a)
+            flush()
+    return [done[i] for i in range(1, len(items) + 1)]
+
+
+def print_summary(results, elapsed, log=sys.stderr):
+    files = sum(r["files"] for r in results)
+    unreadable = [(r["name"], f) for r in results for f in r["unreadable"]]
+    errors = [(r["name"], f, msg) for r in results for f, msg in r["errors"]]
+    skipped = [(r["name"], f, reason) for r in results for f, reason in r["skipped"]]
+    duplicates = [(r["name"], f, reason) for r in results for f, reason in r["duplicates"]]
+    seen, repeated = {}, [] # 跨 ITEM：內容相同的檔案 (各 ITEM 仍各自列入整合)
+    for r in results:
+        for f, file_hash, _, _ in r["records"]:
+            if file_hash in seen and seen[file_hash][0] != r["name"]: repeated.append((r["name"], f, *seen[file_hash]))
+            else: seen.setdefault(file_hash, (r["name"], f))
+    empty = [r["name"] for r in results if not r["row"]]
+    print(f"\n完成 {len(results)} 個 ITEM、{files} 個檔案，總耗時 {elapsed:.1f}s", file=log)
+    if unreadable:
+        print(f"無法讀取 (純圖片/掃描) {len(unreadable)} 檔：", file=log)
+        for item, f in unreadable: print(f"  - {item}/{f}", file=log)
+    if errors:
+        print(f"解析失敗 {len(errors)} 檔：", file=log)
+        for item, f, msg in errors: print(f"  - {item}/{f}: {msg}", file=log)
+    if skipped:
+        print(f"超出資源上限 {len(skipped)} 檔：", file=log)
+        for item, f, reason in skipped: print(f"  - {item}/{f}: {reason}", file=log)
+    if duplicates:
+        print(f"重複檔案 (未重複計入) {len(duplicates)} 檔：", file=log)
+        for item, f, reason in duplicates: print(f"  - {item}/{f}: {reason}", file=log)
+    if repeated:
+        print(f"與其他 ITEM 內容相同的檔案 {len(repeated)} 檔：", file=log)
+        for item, f, first_item, first in repeated: print(f"  - {item}/{f} = {first_item}/{first}", file=log)
+    if empty:
+        print(f"沒有有效數據的 ITEM：{', '.join(empty)}", file=log)
+    slowest = sorted(results, key=lambda r: r["seconds"], reverse=True)[:5]
+    if slowest:
+        print("最慢的 ITEM：" + ", ".join(f"{r['name']} {r['seconds']:.1f}s" for r in slowest), file=log)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="檢測報告聚合工具 (命令列批次模式)")
+    parser.add_argument("root", nargs="?", help="報告根目錄，每個子目錄為一個 ITEM")
+    parser.add_argument("--manifest", help="ITEM 清單 (JSON)，取代根目錄掃描")
+    parser.add_argument("-o", "--output", required=True, help="輸出檔 (.csv、.xlsx 或 .parquet)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="同時處理的 ITEM 數")
+    parser.add_argument("--no-cache", action="store_true", help="不使用結果快取")
+    parser.add_argument("--early-exit", action="store_true", help="提前結束模式 (見 core.EarlyExit)")
+    parser.add_argument("--timeout", type=float, default=0, help="單檔時間上限 (秒，0 = 不限)；超過的檔案略過並列於摘要")
+    parser.add_argument("--max-memory-mb", type=float, default=0, help="單檔記憶體上限 (MB，0 = 不限，僅 Unix)")
+    parser.add_argument("--artifacts", help="版面中間檔目錄 (不存在的中間檔會在解析時建立)")
+    parser.add_argument("--dedupe-reports", action="store_true", help="報告編號相同的檔案只解析第一份")
+    parser.add_argument("--history", metavar="DB", help="同時寫入 SQLite 歷史資料庫 (不存在時建立)")
+    args = parser.parse_args(argv)
+
+    if bool(args.root) == bool(args.manifest):
+        parser.error("請指定報告根目錄或 --manifest 其中之一")
+    try:
+        items = load_manifest(args.manifest) if args.manifest else discover_items(args.root)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"無法讀取輸入：{e}", file=sys.stderr)
+        return 2
+    ext = os.path.splitext(args.output)[1].lower()
+    if ext not in SINKS:
+        parser.error("輸出檔副檔名須為 .csv、.xlsx 或 .parquet")
+    if ext == ".parquet" and not core.PARQUET_AVAILABLE:
+        parser.error("輸出 .parquet 需要安裝 pyarrow (pip install pyarrow)，或改用 .csv / .xlsx")
+
+    if args.artifacts:
+        core.ARTIFACT_DIR = os.path.abspath(args.artifacts)
+        os.environ["REPORT_ARTIFACT_DIR"] = core.ARTIFACT_DIR # 非 fork 平台的子行程重新匯入 core 時沿用
+
+    try:
+        store = core.ResultStore(args.history) if args.history else None
+    except sqlite3.Error as e:
+        print(f"無法開啟歷史資料庫：{e}", file=sys.stderr)
+        return 2
+
+    start = time.perf_counter()
+    sink = SINKS[ext](args.output)
+    try:
+        results = run(items, sink, jobs=args.jobs, early_exit=args.early_exit, use_cache=not args.no_cache,
+                      timeout=args.timeout or None, memory_mb=args.max_memory_mb or None, store=store,
+                      dedupe_reports=args.dedupe_reports)
+    finally:
+        sink.close()
+    print_summary(results, time.perf_counter() - start)
+    return 1 if any(r["errors"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
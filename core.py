@@ -0,0 +1,2449 @@
+"""報告解析核心：關鍵字與規則、各實驗室引擎、批次解析與整合、結果快取、背景解析、匯出與歷史資料庫
+
+網頁版 (app.py) 與命令列 (cli.py) 共用；不依賴 Streamlit。解析子行程 (多行程平行 / 單檔資源上限) 的工作函式
+都在本模組，以「core.函式名」pickle，不受 Streamlit 每次重新執行時替換 __main__ 影響
+"""
+import pdfplumber
+import pypdfium2 as pdfium
+import pandas as pd
+import bisect
+import cProfile
+import gzip
+import hashlib
+import importlib.util
+import inspect
+import io
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import pickle
+import pstats
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache, wraps
+try:
+    import resource # 記憶體上限 (RLIMIT_AS)，僅 Unix
+except ImportError:
+    resource = None
+
+# =============================================================================
+# 1. [Core 1] v63.43 繁簡韓通用關鍵字庫
+# =============================================================================
+
+# 內部處理用的欄位 (引擎產出)
+INTERNAL_COLUMNS = [
+    "Pb", "Cd", "Hg", "Cr6+", "PBB", "PBDE", 
+    "DEHP", "BBP", "DBP", "DIBP", 
+    "PFOS", "PFAS", "F", "CL", "BR", "I", 
+    "日期", "檔案名稱"
+]
+
+# 最終顯示用的欄位 (UI 呈現)
+DISPLAY_COLUMNS = [
+    "ITEM", "Pb", "Cd", "Hg", "Cr+6", "PBBs", "PBDEs", 
+    "DEHP", "BBP", "DBP", "DIBP", 
+    "F", "Cl", "Br", "I", "PFOS", "PFAS", 
+    "Date", "File Name"
+]
+
+# 欄位對應映射
+COLUMN_MAPPING = {
+    "Cr6+": "Cr+6",
+    "PBB": "PBBs",
+    "PBDE": "PBDEs",
+    "CL": "Cl",
+    "BR": "Br",
+    "日期": "Date",
+    "檔案名稱": "File Name"
+}
+
+# v63.43 繁簡韓關鍵字、誤判排除詞與各實驗室判定規則統一定義於 rules.json
+RULES_PATH = os.environ.get("REPORT_RULES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.json"))
+with open(RULES_PATH, encoding="utf-8") as _fh:
+    RULES = json.load(_fh)
+
+SIMPLE_KEYWORDS = {k: a["include"] for k, a in RULES["analytes"].items() if a["kind"] == "simple"}
+GROUP_KEYWORDS = {k: a["include"] for k, a in RULES["analytes"].items() if a["kind"] == "group"}
+
+PFAS_SUMMARY_KEYWORDS = ["Per- and Polyfluoroalkyl Substances", "PFAS", "全氟/多氟烷基物質"]
+MSDS_HEADER_KEYWORDS = RULES["term_sets"]["msds_header"]
+
+# =============================================================================
+# 2. [Core 2] 馬來西亞設定
+# =============================================================================
+
+MY_ITEM_RULES = RULES["profiles"]["malaysia"]["patterns"]
+# 預先編譯的馬來西亞樣式：各分析物的項目樣式，以及任一項目的合併樣式 (用於一次找出所有候選行)
+MY_ITEM_PATTERNS = {k: re.compile(v, re.IGNORECASE) for k, v in MY_ITEM_RULES.items() if v}
+MY_ITEM_FILTER = re.compile("|".join(f"(?:{v})" for v in MY_ITEM_RULES.values() if v), re.IGNORECASE)
+# 數值判讀前的清理 (依序套用)；DEHP 先移除名稱中的 2-ethylhexyl，避免 "2" 被當成數值
+MY_DEHP_CLEANUP = [re.compile(r"2-ethylhexyl", re.IGNORECASE), re.compile(r"Di\(2-", re.IGNORECASE)]
+MY_CONTEXT_CLEANUP = [
+    re.compile(r"mg/kg|ppm|%|wt%", re.IGNORECASE),
+    re.compile(r"\(?CAS\s*No\.?[\s\d-]+\)?", re.IGNORECASE),
+    re.compile(r"IEC\s*62321[-\d:+A]*", re.IGNORECASE),
+    re.compile(r"\b(19|20)\d{2}\b"),
+    re.compile(r"(Max|Limit|MDL|LOQ)\s*\d+(\.\d+)?", re.IGNORECASE)
+]
+MY_ND = re.compile(r"(\bN\s*\.?\s*D\s*\.?\b)|(Not\s*Detected)", re.IGNORECASE)
+MY_NEGATIVE = re.compile(r"NEGATIVE", re.IGNORECASE)
+MY_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+
+MY_MDL_BLOCKLIST = {
+    "Pb": [2.0], "Cd": [2.0], "Hg": [2.0], "Cr6+": [8.0, 10.0],
+    "F": [50.0], "CL": [50.0], "BR": [50.0], "I": [50.0],
+    "DEHP": [50.0], "BBP": [50.0], "DBP": [50.0], "DIBP": [50.0]
+}
+
+MONTH_MAP = {
+    'jan': 1, 'january': 1, 'feb': 2, 'february': 2, 'mar': 3, 'march': 3,
+    'apr': 4, 'april': 4, 'may': 5, 'jun': 6, 'june': 6, 'jul': 7, 'july': 7,
+    'aug': 8, 'august': 8, 'sep': 9, 'september': 9, 'sept': 9, 'oct': 10, 'october': 10,
+    'nov': 11, 'november': 11, 'dec': 12, 'december': 12
+}
+
+# =============================================================================
+# 3. 共用輔助函式
+# =============================================================================
+
+def clean_text(text):
+    if not text: return ""
+    return str(text).replace('\n', ' ').strip()
+
+def is_valid_date(dt):
+    if 2000 <= dt.year <= 2030: return True
+    return False
+
+def is_suspicious_limit_value(val):
+    try:
+        n = float(val)
+        if n in [1000.0, 100.0, 50.0, 25.0, 10.0, 5.0, 2.0, 0.003, 0.005, 0.01, 0.05, 0.050, 0.0005]: return True
+        return False
+    except: return False
+
+def parse_value_priority(value_str):
+    raw_val = clean_text(value_str)
+    if "(" in raw_val and ")" in raw_val:
+        if re.search(r"\(\d+\)", raw_val):
+            raw_val = raw_val.split("(")[0].strip()
+    val = raw_val.replace("mg/kg", "").replace("ppm", "").replace("%", "").replace("µg/cm²", "").strip()
+    
+    if not val: return (0, 0, "")
+    val_lower = val.lower()
+    
+    if val_lower in ["result", "limit", "mdl", "loq", "rl", "unit", "method", "004", "001", "no.1", "---", "-", "limits", "n.a.", "/"]: 
+        return (0, 0, "")
+    if re.search(r"\d+-\d+-\d+", val): return (0, 0, "") 
+    
+    num_only_match = re.search(r"^([\d\.]+)$", val)
+    if num_only_match:
+        if is_suspicious_limit_value(num_only_match.group(1)): return (0, 0, "")
+
+    if "nd" in val_lower or "n.d." in val_lower or "<" in val_lower: return (1, 0, "N.D.")
+    if "negative" in val_lower or "陰性" in val_lower: return (2, 0, "NEGATIVE")
+    
+    num_match = re.search(r"^([\d\.]+)(.*)$", val)
+    if num_match:
+        try:
+            number = float(num_match.group(1))
+            return (3, number, val)
+        except: pass
+    return (0, 0, val)
+
+def format_output_value(val):
+    try:
+        f = float(val)
+        if f.is_integer():
+            return str(int(f))
+        return str(f)
+    except:
+        return str(val)
+
+def identify_company(text):
+    txt = text.lower()
+    if "sgs" in txt: return "SGS"
+    if "intertek" in txt: return "INTERTEK"
+    if "cti" in txt or "centre testing" in txt: return "CTI"
+    if "ctic" in txt: return "CTIC"
+    return "OTHERS"
+
+class KeywordMatcher:
+    """將所有關鍵字與排除詞編譯成單一 trie 正規式，一次掃描即取得字串中出現的全部詞 (小寫)"""
+    def __init__(self, terms):
+        terms = sorted({t.lower() for t in terms})
+        trie = {}
+        for term in terms:
+            node = trie
+            for ch in term: node = node.setdefault(ch, {})
+            node[""] = True
+        # 以前瞻 (?=...) 逐位置比對，trie 的貪婪結構會取得該位置最長的詞；
+        # 同位置較短的詞必為其前綴，故以前綴閉包補齊
+        self._regex = re.compile("(?=(" + self._trie_pattern(trie) + "))")
+        self._prefix_closure = {t: frozenset(p for p in terms if t.startswith(p)) for t in terms}
+
+    @classmethod
+    def _trie_pattern(cls, node):
+        alts = [re.escape(ch) + cls._trie_pattern(child) for ch, child in sorted(node.items()) if ch]
+        if not alts: return ""
+        body = alts[0] if len(alts) == 1 and "" not in node else "(?:" + "|".join(alts) + ")"
+        return body + ("?" if "" in node else "")
+
+    def scan(self, text_lower):
+        hits = set()
+        for m in self._regex.finditer(text_lower):
+            hits |= self._prefix_closure[m.group(1)]
+        return hits
+
+class RuleSet:
+    """由規則檔編譯的分析物判定器
+    所有 profile 的詞彙共用一次 KeywordMatcher 掃描，再以「詞 → 分析物」索引只檢查候選分析物的排除/覆寫規則
+    """
+    def __init__(self, rules):
+        self.rules = rules
+        self.term_sets = rules.get("term_sets", {})
+        self.analytes = rules["analytes"]
+        self.profiles = {}
+        self.resolved = {}
+        all_terms = set()
+        for name in rules["profiles"]:
+            raw = self._resolve(name)
+            self.resolved[name] = raw
+            prof = self._compile(raw)
+            self.profiles[name] = prof
+            all_terms |= prof["terms"]
+        self.matcher = KeywordMatcher(all_terms)
+
+    def _resolve(self, name):
+        """處理 extends 繼承：dict 欄位逐分析物合併，其餘欄位由子 profile 覆寫"""
+        raw = self.rules["profiles"][name]
+        merged = dict(self._resolve(raw["extends"])) if "extends" in raw else {}
+        for key, value in raw.items():
+            if key == "extends": continue
+            if isinstance(value, dict) and isinstance(merged.get(key), dict):
+                merged[key] = {**merged[key], **value}
+            else:
+                merged[key] = value
+        return merged
+
+    def _expand(self, words):
+        out = set()
+        for w in words:
+            if w.startswith("$"): out |= self._expand(self.term_sets[w[1:]])
+            else: out.add(w.lower())
+        return out
+
+    def _compile(self, raw):
+        allowed = raw.get("analytes")
+        include = raw.get("include", {})
+        keys = [k for k in self.analytes if allowed is None or k in allowed]
+        prof = {
+            "simple_keys": [k for k in keys if self.analytes[k]["kind"] == "simple"] if raw.get("simple", "all") != "none" else [],
+            "group_keys": [k for k in keys if self.analytes[k]["kind"] == "group"] if raw.get("group", "all") != "none" else [],
+            "simple_mode": raw.get("simple", "all"),
+            "group_mode": raw.get("group", "all"),
+            "exclude": {k: frozenset(self._expand(v)) for k, v in raw.get("exclude", {}).items() if v},
+            "override": {k: frozenset(self._expand(v)) for k, v in raw.get("override", {}).items() if v},
+            "skip": frozenset(self._expand(raw.get("skip", []))),
+            "veto_simple": frozenset(self._expand(raw.get("veto_simple", []))),
+            "index": {}
+        }
+        for key in keys:
+            for term in self._expand(include.get(key, self.analytes[key]["include"])):
+                prof["index"].setdefault(term, set()).add(key)
+        prof["terms"] = set(prof["index"]) | prof["skip"] | prof["veto_simple"]
+        for group in (prof["exclude"], prof["override"]):
+            for terms in group.values(): prof["terms"] |= terms
+        return prof
+
+    def version(self, name):
+        """profile 內容 (含繼承與引用的關鍵字) 的雜湊，供結果快取判斷失效"""
+        raw = self.resolved[name]
+        used = {k: self.analytes[k] for k in self.analytes if raw.get("analytes") is None or k in raw["analytes"]}
+        payload = json.dumps([raw, used, self.term_sets], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    def _select(self, prof, keys, mode, hits, candidates, targets):
+        matched = []
+        for key in keys:
+            if key not in candidates or (targets and key not in targets): continue
+            excl = prof["exclude"].get(key)
+            if excl and not hits.isdisjoint(excl):
+                override = prof["override"].get(key)
+                if not (override and not hits.isdisjoint(override)): continue
+            matched.append(key)
+            if mode != "all": break
+        return matched
+
+    def classify(self, text_lower, profile, targets=None):
+        """回傳 (命中的 simple 分析物, 命中的 group 分析物)，依 profile 的 first/all 模式"""
+        prof = self.profiles[profile]
+        hits = self.matcher.scan(text_lower)
+        if not hits or not hits.isdisjoint(prof["skip"]): return [], []
+        candidates = set()
+        for term in hits:
+            candidates |= prof["index"].get(term, set())
+        if not candidates: return [], []
+        simple = []
+        if hits.isdisjoint(prof["veto_simple"]):
+            simple = self._select(prof, prof["simple_keys"], prof["simple_mode"], hits, candidates, targets)
+        if simple and prof["group_mode"] == "unless_simple": return simple, []
+        return simple, self._select(prof, prof["group_keys"], prof["group_mode"], hits, candidates, targets)
+
+    def markers(self, profiles, extra=()):
+        """表格頁預分類的標記詞：各 profile 分析物關鍵字中最長的詞元 (非 ASCII 詞元只取首字，避免窄欄換行切斷)"""
+        out = set()
+        for word in [t for name in profiles for t in self.profiles[name]["index"]] + list(self._expand(extra)):
+            token = max(word.split(), key=len)
+            out.add(token if token.isascii() else token[0])
+        return out
+
+ANALYTE_RULES = RuleSet(RULES)
+
+# 表格頁預分類：lines 策略只由框線找表格，沒有框線的頁面必無表格；字元層不含任何標記詞的頁面不會產生分析物列
+TABLE_PAGE_FILTER = True # False 時只做無框線略過 (必定與逐頁 extract_tables 相同)
+TABLE_PAGE_PADDING = 5 # 裁切範圍在框線外框再外擴的點數
+TABLE_CROP_MIN_OUTSIDE = 0.5 # 框線範圍外 (上下) 的字元比例達此值才裁切
+TABLE_PAGE_MARKER_TERMS = sorted(ANALYTE_RULES.markers(["standard", "cti", "intertek", "halogen_block"], ["$table_page_markers"]),
+                                 key=lambda t: (-len(t), t))
+TABLE_PAGE_MARKERS = re.compile("|".join(re.escape(t) for t in TABLE_PAGE_MARKER_TERMS))
+LIGATURES = str.maketrans({"ﬀ": "ff", "ﬃ": "ffi", "ﬄ": "ffl", "ﬁ": "fi", "ﬂ": "fl", "ﬆ": "st", "ﬅ": "st"})
+
+def has_table_markers(stream):
+    """字元層串流 (依內容順序串接的字元) 去除空白、轉小寫並展開連字後是否含任一標記詞"""
+    return bool(TABLE_PAGE_MARKERS.search(re.sub(r"\s+", "", stream.lower().translate(LIGATURES))))
+
+class StageTimer:
+    """輕量的分階段計時 (ms)：巢狀階段只計自身時間 (扣除子階段)，各階段加總即為總耗時"""
+    def __init__(self):
+        self.ms = {}
+        self.calls = {}
+        self._stack = []
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        self._stack.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            child = self._stack.pop()
+            self.ms[name] = self.ms.get(name, 0.0) + elapsed - child
+            self.calls[name] = self.calls.get(name, 0) + 1
+            if self._stack: self._stack[-1] += elapsed
+
+STREAM_MIN_PAGES = 10 # 頁數達此值的 PDF 以串流模式解析 (每頁解析一次後即釋放 pdfplumber 的版面物件)
+
+# 純文字擷取後端："pdfminer" = pdfplumber extract_text (預設)；"pdfium" = PDFium 直接取文字，不做 pdfminer 版面分析，
+# 表格擷取一律使用 pdfminer。兩者的斷行 / 空白規則不完全相同，切換前請以 benchmark.py backend 對實際報告做差異比對
+TEXT_BACKEND = os.environ.get("REPORT_TEXT_BACKEND", "pdfminer")
+if TEXT_BACKEND not in ("pdfminer", "pdfium"):
+    raise ValueError(f"REPORT_TEXT_BACKEND 須為 pdfminer 或 pdfium：{TEXT_BACKEND}")
+PDFIUM_LOCK = threading.Lock() # PDFium 不可在多個執行緒同時呼叫 (背景解析與 cProfile 可能同時進行)
+
+class PdfiumText:
+    """PDFium 純文字後端：只取各頁文字 (斷行統一為 \\n)，供路由、掃描檔判定、日期與純文字引擎使用"""
+    def __init__(self, data):
+        with PDFIUM_LOCK:
+            self.pdf = pdfium.PdfDocument(data)
+
+    def text(self, i):
+        with PDFIUM_LOCK:
+            page = self.pdf[i]
+            textpage = page.get_textpage()
+            try:
+                text = textpage.get_text_bounded()
+            finally:
+                textpage.close()
+                page.close()
+        return text.replace("\r\n", "\n").replace("\r", "\n")
+
+    def close(self):
+        with PDFIUM_LOCK:
+            self.pdf.close()
+
+class PageCache:
+    """單一 PDF 的逐頁快取：文字與表格延遲計算、每頁只解析一次，檔案處理完即釋放
+    timer: StageTimer，文字 / 表格擷取的耗時記在 "text" / "tables" 階段，引擎也透過 doc.timer 記錄其他階段
+    streaming: 串流模式 (None = 依 STREAM_MIN_PAGES 自動決定)。pdfplumber 會把每個碰過的頁面的版面物件留在記憶體
+      (每頁數 MB)，串流模式在頁面第一次被存取時一次取出文字、字元數與表格 (prefetch_tables)，隨即 page.close() 釋放，
+      只保留文字與表格內容，記憶體峰值不隨頁數成長；代價是部分頁面會多擷取引擎用不到的文字或表格
+    text_backend: 純文字後端 (PdfiumText)，None = pdfplumber extract_text；設定時只需文字的頁面完全不做 pdfminer 版面分析
+    data: PDF 原始內容，供 marker_text 在需要時以 PDFium 取文字 (None = marker_text 退回 text)
+    """
+    def __init__(self, pdf, timer=None, streaming=None, text_backend=None, data=None):
+        self.pdf = pdf
+        self.timer = timer or StageTimer()
+        self.text_backend = text_backend
+        self._data = data
+        self._marker_backend = None
+        self._marker_texts = {}
+        self.page_count = len(pdf.pages)
+        self.streaming = self.page_count >= STREAM_MIN_PAGES if streaming is None else streaming
+        self.prefetch_tables = True # 串流模式下載入頁面時是否一併擷取表格 (路由到不用表格的引擎後關閉)
+        self._texts = {}
+        self._tables = {}
+        self._char_counts = {}
+        self.counters = {"text_hits": 0, "text_misses": 0, "table_hits": 0, "table_misses": 0,
+                         "table_pages": 0, "table_skip_no_edges": 0, "table_skip_no_markers": 0, "table_pages_cropped": 0,
+                         "table_ms": 0.0, "pages_released": 0, "template_hits": 0, "template_misses": 0}
+
+    def _backend_text(self, i):
+        if i not in self._texts:
+            with self.timer.stage("text"):
+                self._texts[i] = self.text_backend.text(i)
+        return self._texts[i]
+
+    def _load(self, i, tables):
+        """串流模式：一次取出該頁所需的全部內容後釋放版面物件"""
+        if self.text_backend is not None:
+            self._char_counts[i] = len("".join(self._backend_text(i).split()))
+            if not tables or i in self._tables: return # 只需文字：不載入 pdfminer 版面
+        page = self.pdf.pages[i]
+        if i not in self._texts:
+            with self.timer.stage("text"):
+                self._texts[i] = page.extract_text() or ""
+        if i not in self._char_counts:
+            self._char_counts[i] = self._count_chars(page)
+        if tables and i not in self._tables:
+            self._extract_tables(i)
+        page.close()
+        self.counters["pages_released"] += 1
+
+    def text(self, i):
+        if i in self._texts:
+            self.counters["text_hits"] += 1
+        else:
+            self.counters["text_misses"] += 1
+            if self.streaming:
+                self._load(i, self.prefetch_tables)
+            elif self.text_backend is not None:
+                self._backend_text(i)
+            else:
+                with self.timer.stage("text"):
+                    self._texts[i] = self.pdf.pages[i].extract_text() or ""
+        return self._texts[i]
+
+    def marker_text(self, i):
+        """只供標記詞 / 目標分析物判定的文字：已擷取的文字優先，否則以 PDFium 取文字，
+        不做 pdfminer 版面分析、串流模式也不會因此預取表格 (斷行與 text 不完全相同，不可用於數值擷取)
+        """
+        if i in self._texts: return self._texts[i]
+        if self.text_backend is not None: return self._backend_text(i)
+        if self._data is None: return self.text(i)
+        if i not in self._marker_texts:
+            with self.timer.stage("text"):
+                if self._marker_backend is None: self._marker_backend = PdfiumText(self._data)
+                self._marker_texts[i] = self._marker_backend.text(i)
+        return self._marker_texts[i]
+
+    @staticmethod
+    def _count_chars(page, limit=None):
+        n = 0
+        for c in page.chars:
+            if not c["text"].isspace():
+                n += len(c["text"])
+                if limit and n >= limit: break
+        return n
+
+    def char_count(self, i, limit=None):
+        """頁面字元層 (page.chars) 的非空白字元數，不做版面分析；達 limit 即提前結束 (串流模式回傳完整字數)
+        使用純文字後端時改為該頁文字的非空白字元數 (文字保留供後續使用)
+        """
+        if self.text_backend is not None and not self.streaming:
+            return len("".join(self._backend_text(i).split()))
+        if self.streaming:
+            if i not in self._char_counts: self._load(i, self.prefetch_tables)
+            return self._char_counts[i]
+        return self._count_chars(self.pdf.pages[i], limit)
+
+    def table_region(self, i, markers=TABLE_PAGE_FILTER):
+        """表格頁預分類
+        markers: 是否檢查標記詞 (預設依 TABLE_PAGE_FILTER；版面中間檔只做與規則無關的框線判定)
+        Returns: (範圍, 略過原因)；範圍為所有框線的外框或整頁，判定不可能有結果表格時為 None，原因為 "no_edges" / "no_markers"
+        """
+        page = self.pdf.pages[i]
+        edges = page.edges
+        if not edges: return None, "no_edges"
+        if markers and not has_table_markers("".join(c["text"] for c in page.chars)): return None, "no_markers"
+        x0, top, x1, bottom = page.bbox
+        region = (max(x0, min(e["x0"] for e in edges) - TABLE_PAGE_PADDING),
+                  max(top, min(e["top"] for e in edges) - TABLE_PAGE_PADDING),
+                  min(x1, max(e["x1"] for e in edges) + TABLE_PAGE_PADDING),
+                  min(bottom, max(e["bottom"] for e in edges) + TABLE_PAGE_PADDING))
+        # 裁切本身要過濾整頁物件，只有框線範圍外的字元夠多 (例如表格下方的長段說明) 才划算
+        chars = page.chars
+        outside = sum(1 for c in chars if c["bottom"] < region[1] or c["top"] > region[3])
+        if chars and outside / len(chars) >= TABLE_CROP_MIN_OUTSIDE: return region, None
+        return tuple(page.bbox), None
+
+    def _extract_tables(self, i, markers=TABLE_PAGE_FILTER):
+        with self.timer.stage("tables"):
+            page = self.pdf.pages[i]
+            region, reason = self.table_region(i, markers)
+            if region is None:
+                self.counters[f"table_skip_{reason}"] += 1
+                self._tables[i] = []
+            else:
+                start = time.perf_counter()
+                if region != tuple(page.bbox):
+                    self.counters["table_pages_cropped"] += 1
+                    page = page.crop(region)
+                self._tables[i] = page.extract_tables()
+                self.counters["table_pages"] += 1
+                self.counters["table_ms"] += (time.perf_counter() - start) * 1000
+
+    def tables(self, i):
+        if i in self._tables:
+            self.counters["table_hits"] += 1
+        else:
+            self.counters["table_misses"] += 1
+            if self.streaming:
+                self._load(i, True)
+            else:
+                self._extract_tables(i)
+        return self._tables[i]
+
+    def close(self):
+        self._texts.clear()
+        self._tables.clear()
+        self._char_counts.clear()
+        self._marker_texts.clear()
+        if self.text_backend is not None: self.text_backend.close()
+        if self._marker_backend is not None: self._marker_backend.close()
+
+class EarlyExit:
+    """選用的提前結束 (early_exit 模式，預設關閉)
+    目標分析物 = 已擷取文字中 (依引擎的 profile) 提到的分析物；所有目標都已有數值，且後面的頁面文字都不含任何分析物標記詞
+    (TABLE_PAGE_MARKERS) 時停止往後翻頁。後面頁面不可能產生分析物列，因此結果與完整解析相同；
+    最後一個含標記詞的頁面在所有目標都有數值後才由最後一頁往前找一次，使用 doc.marker_text (PDFium 取文字，
+    不做 pdfminer 版面分析、不預取表格)，避免為了判斷能否停止而完整解析剩餘頁面
+    """
+    def __init__(self, text, pools, doc, profile):
+        """pools: 該引擎使用的 AnalytePool；profile: 該引擎判定分析物的規則 (standard / intertek)"""
+        self.targets = set()
+        for line in text.lower().splitlines():
+            simple_keys, group_keys = ANALYTE_RULES.classify(line, profile)
+            self.targets.update(simple_keys, group_keys)
+        self.doc = doc
+        self.found = set()
+        self.started = False
+        self.last_page = None
+        self._last_marked = None
+        self._counts = self._snapshot(pools)
+
+    @staticmethod
+    def _snapshot(pools):
+        counts = {}
+        for pool in pools:
+            for key, n in zip(ANALYTE_KEYS, pool.counts): counts[key] = counts.get(key, 0) + n
+        return counts
+
+    def page_done(self, i, pools):
+        """每頁處理完呼叫；回傳 True 表示可停止"""
+        counts = self._snapshot(pools)
+        new = {k for k, n in counts.items() if n > self._counts.get(k, 0)}
+        self._counts = counts
+        if new:
+            self.started = True
+            self.found |= new
+        if not (self.started and self.targets <= self.found): return False
+        if self._last_marked is None:
+            self._last_marked = next((j for j in range(self.doc.page_count - 1, i, -1) if has_table_markers(self.doc.marker_text(j))), i)
+        if i < self._last_marked: return False
+        self.last_page = i
+        return True
+
+ANALYTE_KEYS = [k for k in INTERNAL_COLUMNS if k not in ["日期", "檔案名稱"]]
+ANALYTE_INDEX = {k: i for i, k in enumerate(ANALYTE_KEYS)}
+
+class AnalytePool:
+    """引擎的單檔擷取結果 (取代 {分析物: [{"priority": ..., "filename": ...}, ...]})
+    每個分析物只保留目前最佳的 parse_value_priority 結果：依 (類型, 數值) 取最大，同分保留先加入者，
+    與收集全部候選後以 sorted(..., reverse=True)[0] 取第一個的結果相同；另記錄候選數供 EarlyExit 判斷是否有新數值
+    """
+    __slots__ = ("best", "counts")
+
+    def __init__(self):
+        self.best = [None] * len(ANALYTE_KEYS)
+        self.counts = [0] * len(ANALYTE_KEYS)
+
+    def add(self, key, priority):
+        i = ANALYTE_INDEX[key]
+        best = self.best[i]
+        if best is None or (priority[0], priority[1]) > (best[0], best[1]): self.best[i] = priority
+        self.counts[i] += 1
+
+    def has(self, key):
+        return self.counts[ANALYTE_INDEX[key]] > 0
+
+    def get(self, key):
+        """最佳的 (類型, 數值, 文字)，沒有候選時為 None"""
+        return self.best[ANALYTE_INDEX[key]]
+
+    def items(self):
+        """依 ANALYTE_KEYS 順序產生有候選的 (分析物, 最佳結果)"""
+        return ((k, best) for k, best in zip(ANALYTE_KEYS, self.best) if best is not None)
+
+# =============================================================================
+# 4. 引擎區域 (v63.43 取值邏輯；分析物判定改由 rules.json 編譯，日期共用一次掃描，單檔結果存入 AnalytePool)
+# =============================================================================
+
+# 日期掃描引擎：各實驗室共用一次掃描，計分方式由 DATE_PROFILES 決定
+#   tokens: 英數詞元的「月 日 年 / 日 月 年 / 年 月 日」三連組，依往前 window 個詞元的關鍵字計分 (依序第一個命中的規則生效)
+#   lines:  逐行比對中文 / 日月年 / 月日年格式，依整行是否含關鍵字計分
+#   anchor: 固定標籤 (REPORTED DATE) 後的第一個日期
+# tokens 模式只以單一英數詞元比對關鍵字，舊版清單中含空白、標點或中文的詞 ("testing period"、"report date"、"date:"、
+# "issue date"、"检测日期" 等) 從未命中，為維持輸出相同不列入
+DATE_PROFILES = {
+    "global": {"mode": "tokens", "base": 100, "window": 10, "rules": [
+        (("received", "receive", "expiry", "valid", "process"), 100 - 1000),
+        (("testing", "period", "test"), 100 + 10)]},
+    "intertek": {"mode": "tokens", "base": 100, "window": 10, "rules": [
+        (("received", "receive", "expiry", "valid", "process"), 100 - 1000)]},
+    "standard": {"mode": "lines", "base": 1, "rules": [
+        (("approve", "approved", "receive", "received", "receipt", "period", "expiry", "valid", "testing period", "检测日期"), -100),
+        (("report date", "issue date", "date:", "dated", "日期"), 100)]},
+    "malaysia": {"mode": "anchor", "score": 100},
+}
+
+DATE_TOKEN = re.compile(r"[a-z0-9]+")
+DATE_YEAR_TOKENS = frozenset(str(y) for y in range(2000, 2031)) # is_valid_date 的年份範圍
+DATE_YEAR = re.compile(r"20\d{2}")
+DATE_CN = re.compile(r"(20\d{2})\s*年\s*(0?[1-9]|1[0-2])\s*月\s*(3[01]|[12][0-9]|0?[1-9])\s*日")
+DATE_DMY = re.compile(r"(3[01]|[12][0-9]|0?[1-9])\s+([a-zA-Z]{3,})\s+(20\d{2})")
+DATE_MDY = re.compile(r"([a-zA-Z]{3,})\s+(3[01]|[12][0-9]|0?[1-9])\s+(20\d{2})")
+DATE_LINE_SEPARATORS = str.maketrans({c: " " for c in ".,-/年月日"})
+DATE_ANCHOR = re.compile(r"(REPORTED DATE|TEST REPORT REPORTED DATE)\s*[:\-]?\s*([^\n]+)", re.IGNORECASE)
+# strptime 的 %b / %B 只認得標準縮寫與全名 (不含 sept)
+MONTH_NAMES = {k: v for k, v in MONTH_MAP.items() if k != "sept"}
+
+_DATE_RULES = {}
+
+def _date_rules(profile):
+    """將 profile 的關鍵字清單編譯為 (frozenset / 正規式, 分數)，只編譯一次"""
+    if profile not in _DATE_RULES:
+        prof = DATE_PROFILES[profile]
+        if prof["mode"] == "tokens":
+            _DATE_RULES[profile] = [(frozenset(terms), score) for terms, score in prof["rules"]]
+        else:
+            _DATE_RULES[profile] = [(re.compile("|".join(re.escape(t) for t in terms)), score) for terms, score in prof.get("rules", [])]
+    return _DATE_RULES[profile]
+
+def _make_date(y, m, d):
+    try:
+        dt = datetime(y, m, d)
+    except (ValueError, OverflowError):
+        return None
+    return dt if is_valid_date(dt) else None
+
+def _scan_date_tokens(text, prof, rules):
+    """只在有效年份詞元附近組三連組 (年份必在第一或第三個位置)，不逐一檢查每個詞元"""
+    tokens = DATE_TOKEN.findall(text.lower())
+    n = len(tokens)
+    found = []
+    for j in [j for j, t in enumerate(tokens) if t in DATE_YEAR_TOKENS]:
+        y = int(tokens[j])
+        if j >= 2:
+            t1, t2 = tokens[j - 2], tokens[j - 1]
+            dt = None
+            if t1 in MONTH_MAP and t2.isdigit(): dt = _make_date(y, MONTH_MAP[t1], int(t2))
+            elif t1.isdigit() and t2 in MONTH_MAP: dt = _make_date(y, MONTH_MAP[t2], int(t1))
+            if dt: found.append((j - 2, dt))
+        if j + 2 < n and tokens[j + 1].isdigit() and tokens[j + 2].isdigit():
+            dt = _make_date(y, int(tokens[j + 1]), int(tokens[j + 2]))
+            if dt: found.append((j, dt))
+    found.sort(key=lambda x: x[0])
+    candidates = []
+    for i, dt in found:
+        window = tokens[max(0, i - prof["window"]):i]
+        score = prof["base"]
+        for terms, rule_score in rules:
+            if not terms.isdisjoint(window):
+                score = rule_score
+                break
+        candidates.append((score, dt))
+    return candidates
+
+def _scan_date_lines(text, prof, rules):
+    """只處理含 20xx 的行 (三種格式都需要年份)；行內清理不會把字元接起來，因此不會漏掉清理後才出現的年份"""
+    candidates = []
+    pos = 0
+    while True:
+        m = DATE_YEAR.search(text, pos)
+        if not m: break
+        start = text.rfind("\n", 0, m.start()) + 1
+        end = text.find("\n", m.end())
+        if end < 0: end = len(text)
+        pos = end + 1
+        line = text[start:end]
+        line_lower = line.lower()
+        score = prof["base"]
+        for pattern, rule_score in rules:
+            if pattern.search(line_lower):
+                score = rule_score
+                break
+        for g in DATE_CN.finditer(line):
+            dt = _make_date(int(g.group(1)), int(g.group(2)), int(g.group(3)))
+            if dt: candidates.append((score, dt))
+        clean_line = " ".join(line.translate(DATE_LINE_SEPARATORS).split())
+        for g in DATE_DMY.finditer(clean_line):
+            month = MONTH_NAMES.get(g.group(2).lower())
+            dt = _make_date(int(g.group(3)), month, int(g.group(1))) if month else None
+            if dt: candidates.append((score, dt))
+        for g in DATE_MDY.finditer(clean_line):
+            month = MONTH_NAMES.get(g.group(1).lower())
+            dt = _make_date(int(g.group(3)), month, int(g.group(2))) if month else None
+            if dt: candidates.append((score, dt))
+    return candidates
+
+def _scan_date_anchor(text, prof):
+    match = DATE_ANCHOR.search(text)
+    if not match: return []
+    d, m, y = None, None, None
+    try:
+        for p in re.sub(r"[^a-zA-Z0-9\s]", " ", match.group(2).strip()).split():
+            if p.isdigit():
+                if len(p) == 4: y = int(p)
+                elif int(p) <= 31: d = int(p)
+            elif p.lower() in MONTH_MAP:
+                m = MONTH_MAP[p.lower()]
+    except ValueError: # isdigit() 為真但 int() 不接受的字元 (如上標數字)
+        return []
+    dt = _make_date(y, m, d) if d and m and y else None
+    return [(prof["score"], dt)] if dt else []
+
+def scan_dates(text, profile):
+    """依實驗室 profile 掃描日期，回傳 [(分數, datetime)]；分數 <= -50 者在 build_file_result 中視為無效"""
+    prof = DATE_PROFILES[profile]
+    if prof["mode"] == "tokens": return _scan_date_tokens(text, prof, _date_rules(profile))
+    if prof["mode"] == "lines": return _scan_date_lines(text, prof, _date_rules(profile))
+    return _scan_date_anchor(text, prof)
+
+class MalaysiaText:
+    """馬來西亞報告的全文索引：只分行一次，以合併樣式在全文中往後搜尋候選行 (任一分析物樣式出現的行)，
+    搜尋到的候選行由各分析物共用，找到需要的行即停止；清理後的上下文依 (行號, 是否 DEHP) 記憶
+    """
+    def __init__(self, text):
+        self.lines = text.splitlines()
+        self._text = "\n".join(self.lines)
+        self._starts = []
+        offset = 0
+        for line in self.lines:
+            self._starts.append(offset)
+            offset += len(line) + 1
+        self.candidates = []
+        self._pos = 0 # 下一次合併搜尋的起點；None = 全文已搜尋完畢
+        self._contexts = {}
+
+    def _iter_candidates(self):
+        """依序產生候選行號；合併樣式的符合可能跨行 (\\s*)，因此每次從下一行行首繼續搜尋，不會漏掉單行內的符合"""
+        n = 0
+        while True:
+            if n < len(self.candidates):
+                yield self.candidates[n]
+                n += 1
+                continue
+            if self._pos is None: return
+            match = MY_ITEM_FILTER.search(self._text, self._pos)
+            if not match:
+                self._pos = None
+                return
+            i = bisect.bisect_right(self._starts, match.start()) - 1
+            self.candidates.append(i)
+            self._pos = self._starts[i + 1] if i + 1 < len(self._starts) else None
+
+    def first_line(self, item_name):
+        """第一個符合該分析物樣式的行號 (數值只取第一個符合行)"""
+        pattern = MY_ITEM_PATTERNS[item_name]
+        for i in self._iter_candidates():
+            if pattern.search(self.lines[i]): return i
+        return None
+
+    def context(self, i, dehp=False):
+        """第 i 行起的上下文 (DEHP 4 行，其餘 2 行)，已移除單位、CAS、方法、年份與限值"""
+        key = (i, dehp)
+        if key not in self._contexts:
+            context = " ".join(self.lines[i:i + (4 if dehp else 2)])
+            for pattern in (MY_DEHP_CLEANUP + MY_CONTEXT_CLEANUP if dehp else MY_CONTEXT_CLEANUP):
+                context = pattern.sub(" ", context)
+            self._contexts[key] = context
+        return self._contexts[key]
+
+def extract_result_malaysia_v7(index, item_name):
+    i = index.first_line(item_name)
+    if i is None: return ""
+    context = index.context(i, item_name == "DEHP")
+    if MY_ND.search(context): return "N.D."
+    if MY_NEGATIVE.search(context): return "NEGATIVE"
+
+    nums = MY_NUMBER.findall(context)
+    if not nums: return "N.D."
+
+    if item_name in ["PBB", "PBDE"]:
+        final_val = nums[0]
+    else:
+        if len(nums) == 1: return "N.D."
+        final_val = nums[0]
+        f_val = float(final_val)
+        if 1990 <= f_val <= 2030 and f_val.is_integer(): final_val = nums[1]
+
+    if float(final_val) in MY_MDL_BLOCKLIST.get(item_name, []): return "N.D."
+    return final_val
+
+def process_malaysia_engine(doc, filename):
+    data_pool = AnalytePool()
+    full_text = ""
+    for i in range(doc.page_count): full_text += doc.text(i) + "\n"
+    with doc.timer.stage("dates"): date_candidates = scan_dates(doc.text(0), "malaysia")
+    index = MalaysiaText(full_text)
+    for col_key in INTERNAL_COLUMNS:
+        if col_key in ["日期", "檔案名稱"]: continue
+        if col_key not in MY_ITEM_PATTERNS: continue
+        val = extract_result_malaysia_v7(index, col_key)
+        if val:
+            prio = parse_value_priority(val)
+            if prio[0] > 0:
+                data_pool.add(col_key, prio)
+    return data_pool, date_candidates
+
+# 表格版型快取：欄位索引只由表頭決定的部分以表頭內容 (指紋) 為鍵快取，同一實驗室 / 版型的表格不必重跑表頭判定；
+# 需要看資料列的判定 (CTI 無 MDL 表頭時、SGS 表頭下兩列) 每次重新計算。命中率見 template_cache_info 與頁面快取統計
+TEMPLATE_CACHE_SIZE = 512
+_TEMPLATE_CALL = threading.local() # 本次版型快取查詢是否實際執行了判定 (各執行緒各自記錄)
+
+def template_cache(func):
+    """版型快取 (lru_cache，大小 TEMPLATE_CACHE_SIZE)：呼叫回傳 (結果, 是否命中)
+    命中與否由本次呼叫是否實際執行 func 判定，不受其他執行緒同時解析影響，供引擎記入 doc.counters；cache_info() 為本行程累計
+    """
+    def compute(*args):
+        _TEMPLATE_CALL.computed = True
+        return func(*args)
+    cached = lru_cache(maxsize=TEMPLATE_CACHE_SIZE)(compute)
+
+    @wraps(func)
+    def lookup(*args):
+        _TEMPLATE_CALL.computed = False
+        result = cached(*args)
+        return result, not _TEMPLATE_CALL.computed
+    lookup.cache_info = cached.cache_info
+    lookup.cache_clear = cached.cache_clear
+    return lookup
+
+@template_cache
+def cti_header_columns(header):
+    """CTI 表頭 (第一列) -> (MDL 欄, 項目欄)；MDL 欄找不到時為 -1，項目欄找不到時為 0"""
+    mdl_col_idx = -1
+    item_col_idx = -1
+    for c in range(len(header)):
+        h = clean_text(header[c]).lower()
+        if "mdl" in h or "loq" in h:
+            mdl_col_idx = c
+            break
+    for c in range(len(header)):
+        h = str(header[c]).lower()
+        if "item" in h or "項目" in h or "项目" in h:
+            item_col_idx = c
+            break
+    if item_col_idx == -1: item_col_idx = 0
+    return mdl_col_idx, item_col_idx
+
+def template_cache_info():
+    """各版型快取累計的 (命中, 未命中) 次數 (本行程)"""
+    infos = [f.cache_info() for f in (_header_columns_v60, cti_header_columns, intertek_header_columns)]
+    return sum(i.hits for i in infos), sum(i.misses for i in infos)
+
+def cti_mdl_from_data(table):
+    """沒有 MDL 表頭時，以常見 MDL 數值佔一半以上的欄位為 MDL 欄"""
+    for c in range(len(table[0])):
+        num_count = 0
+        row_count = 0
+        for r in range(1, len(table)):
+            val = clean_text(table[r][c]).replace("mg/kg", "").strip()
+            if not val: continue
+            row_count += 1
+            if val in ["2", "5", "10", "50", "100", "0.01", "20", "25"]: num_count += 1
+        if row_count > 0 and (num_count / row_count) >= 0.5:
+            return c
+    return -1
+
+def process_cti_engine(doc, filename):
+    data_pool = AnalytePool()
+    text_for_dates = ""
+    for i in range(min(3, doc.page_count)): text_for_dates += doc.text(i) + " " 
+    with doc.timer.stage("dates"): date_candidates = scan_dates(text_for_dates, "global")
+    for i in range(doc.page_count):
+        tables = doc.tables(i)
+        for table in tables:
+            if not table or len(table) < 2: continue
+            (mdl_col_idx, item_col_idx), hit = cti_header_columns(tuple(table[0]))
+            doc.counters["template_hits" if hit else "template_misses"] += 1
+            if mdl_col_idx == -1: mdl_col_idx = cti_mdl_from_data(table) # 依資料判定，不快取
+            if mdl_col_idx == -1: continue 
+            data_col_indices = []
+            for c in range(item_col_idx + 1, mdl_col_idx):
+                data_col_indices.append(c)
+            if not data_col_indices:
+                data_col_indices = [mdl_col_idx - 1]
+            for row in table:
+                if len(row) <= mdl_col_idx: continue
+                item_text = clean_text(row[item_col_idx]).lower()
+                simple_keys, group_keys = ANALYTE_RULES.classify(item_text, "cti")
+                if not simple_keys and not group_keys: continue
+                valid_numbers = []
+                has_negative = False
+                has_nd = False
+                for c_idx in data_col_indices:
+                    if c_idx < len(row):
+                        raw_val = clean_text(row[c_idx])
+                        prio = parse_value_priority(raw_val)
+                        if prio[0] == 3:
+                            valid_numbers.append(prio[1])
+                        elif prio[0] == 2:
+                            has_negative = True
+                        elif prio[0] == 1:
+                            has_nd = True
+                final_prio = (0, 0, "")
+                if valid_numbers:
+                    max_val = max(valid_numbers) 
+                    final_prio = (3, max_val, str(max_val))
+                elif has_negative:
+                    final_prio = (2, 0, "NEGATIVE")
+                elif has_nd:
+                    final_prio = (1, 0, "N.D.")
+                if final_prio[0] == 0: continue
+                for key in simple_keys + group_keys:
+                    data_pool.add(key, final_prio)
+    return data_pool, date_candidates
+
+def identify_columns_v60(table, company):
+    """欄位判定看前三列：第一列 (表頭) 的判定以表頭內容 (含欄數) 為鍵快取 (見 TEMPLATE_CACHE_SIZE)，
+    第二、三列可能已是資料列，每次重新判定後與表頭結果合併；結果與三列一起逐列逐格判定相同
+    Returns: ((項目欄, 結果欄, 是否略過, MDL 欄), 表頭是否命中快取)
+    """
+    header_scan, hit = _header_columns_v60(tuple(table[0]), company)
+    scans = [header_scan]
+    scans += [_scan_header_row_v60(table[r], company) for r in range(1, min(3, len(table)))]
+    # 逐列掃描時先出現者優先：表頭列的結果優先於後面的列
+    item_idx, mdl_idx, result_idx = (next((scan[k] for scan in scans if scan[k] != -1), -1) for k in range(3))
+    is_msds_table = any(scan[3] for scan in scans) and not any(scan[4] for scan in scans)
+    if result_idx == -1 and company == "SGS" and mdl_idx != -1:
+        forbidden_headers = ["unit", "method", "limit", "mdl", "loq", "item", "cas"]
+        right_idx = mdl_idx + 1
+        if right_idx < len(table[0]):
+            header = clean_text(table[0][right_idx]).lower()
+            if not any(fb in header for fb in forbidden_headers): result_idx = right_idx
+        if result_idx == -1:
+            left_idx = mdl_idx - 1
+            if left_idx >= 0:
+                header = clean_text(table[0][left_idx]).lower()
+                if not any(fb in header for fb in forbidden_headers): result_idx = left_idx
+    is_reference_table = False
+    if is_msds_table or result_idx == -1: is_reference_table = True
+    return (item_idx, result_idx, is_reference_table, mdl_idx), hit
+
+def _scan_header_row_v60(row, company):
+    """單列表頭判定 -> (項目欄, MDL 欄, 結果欄, 含 MSDS 表頭詞, 含 "result")；欄位找不到時為 -1"""
+    item_idx = -1
+    result_idx = -1
+    mdl_idx = -1
+    row_text = " ".join([str(c).lower() for c in row if c])
+    for c_idx, cell in enumerate(row):
+        txt = clean_text(cell).lower()
+        if not txt: continue
+        if "test item" in txt or "tested item" in txt or "parameter" in txt:
+            if item_idx == -1: item_idx = c_idx
+        if "mdl" in txt or "loq" in txt:
+            if mdl_idx == -1: mdl_idx = c_idx
+        if company == "SGS":
+             if ("result" in txt or "結果" in txt or re.search(r"00[1-9]", txt) or re.search(r"[a-zA-Z]\s*\.\s*[a-zA-Z]\d+", txt)):
+                if "cas" not in txt and "method" not in txt and "limit" not in txt:
+                    if result_idx == -1: result_idx = c_idx
+    return item_idx, mdl_idx, result_idx, any(k in row_text for k in MSDS_HEADER_KEYWORDS), "result" in row_text
+
+_header_columns_v60 = template_cache(_scan_header_row_v60)
+
+def parse_text_lines_v60(text, data_pool, file_group_data, filename, company, targets=None):
+    lines = text.split('\n')
+    for line in lines:
+        line_clean = clean_text(line)
+        line_lower = line_clean.lower()
+        if not line_clean: continue
+        simple_keys, group_keys = ANALYTE_RULES.classify(line_lower, "text", targets)
+        matched_simple = simple_keys[0] if simple_keys else None
+        matched_group = group_keys[0] if group_keys else None
+        if matched_simple or matched_group:
+            parts = line_clean.split()
+            if len(parts) < 2: continue
+            found_val = ""
+            for part in reversed(parts):
+                p_lower = part.lower()
+                if p_lower in ["mg/kg", "ppm", "2", "5", "10", "50", "100", "1000", "0.1", "-", "---", "unit", "mdl"]: continue
+                if "nd" in p_lower:
+                    found_val = "N.D."
+                    break
+                if re.match(r"^\d+.*$", part): 
+                    val_check = part.replace("▲", "").replace("△", "")
+                    try:
+                        f = float(val_check)
+                        if f not in [100.0, 1000.0, 50.0]:
+                            found_val = part
+                            break
+                    except: pass
+            if found_val:
+                priority = parse_value_priority(found_val)
+                if priority[0] == 0: continue
+                if matched_simple:
+                    data_pool.add(matched_simple, priority)
+                elif matched_group:
+                    file_group_data.add(matched_group, priority)
+
+def process_halogen_block(doc, filename, data_pool, pages=None):
+    for i in range(doc.page_count) if pages is None else pages:
+        text = doc.text(i).lower()
+        if "halogen" in text:
+            tables = doc.tables(i)
+            for table in tables:
+                if not table or len(table) < 2: continue
+                for row in table:
+                    clean_row = [clean_text(cell) for cell in row]
+                    row_txt = "".join(clean_row).lower()
+                    simple_keys, _ = ANALYTE_RULES.classify(row_txt, "halogen_block")
+                    matched_key = simple_keys[0] if simple_keys else None
+                    if matched_key:
+                        result_val = ""
+                        for cell in reversed(clean_row):
+                            c_lower = cell.lower()
+                            if "mg/kg" in c_lower or "ppm" in c_lower or "limit" in c_lower or "unit" in c_lower: continue
+                            if "nd" in c_lower or "n.d." in c_lower:
+                                result_val = cell
+                                break
+                            if re.search(r"^\d+(\.\d+)?", cell):
+                                if is_suspicious_limit_value(cell): continue
+                                result_val = cell
+                                break
+                        if result_val:
+                            priority = parse_value_priority(result_val)
+                            if priority[0] > 0:
+                                data_pool.add(matched_key, priority)
+
+def process_standard_engine(doc, filename, company, early_exit=False):
+    data_pool = AnalytePool()
+    file_dates_candidates = []
+    full_text_content = ""
+    first_page_text = doc.text(0).lower()
+    if "per- and polyfluoroalkyl substances" in first_page_text or "pfas" in first_page_text:
+        data_pool.add("PFAS", (4, 0, "REPORT"))
+    for i in range(min(5, doc.page_count)):
+        txt = doc.text(i)
+        full_text_content += txt + "\n"
+        with doc.timer.stage("dates"): file_dates_candidates.extend(scan_dates(txt, "standard"))
+    file_group_data = AnalytePool() # 群組分析物 (PBB / PBDE) 的各行結果，最後只取檔內最佳值加入 data_pool
+    early = EarlyExit(full_text_content, [data_pool, file_group_data], doc, "standard") if early_exit else None
+    for i in range(doc.page_count):
+        tables = doc.tables(i)
+        for table in tables:
+            if not table or len(table) < 2: continue
+            with doc.timer.stage("identify_columns"):
+                (item_idx, result_idx, is_skip, mdl_idx), hit = identify_columns_v60(table, company)
+                doc.counters["template_hits" if hit else "template_misses"] += 1
+            force_scan = False
+            if is_skip:
+                table_str = str(table).lower()
+                if any(k in table_str for k in ["fluorine", "chlorine", "bromine", "iodine", "lodine"]):
+                    force_scan = True
+                    is_skip = False
+                    if item_idx == -1: item_idx = 0
+            if is_skip: continue
+            for row in table:
+                raw_item_cell = str(row[item_idx]) if item_idx < len(row) and row[item_idx] else ""
+                raw_result_cell = str(row[result_idx]) if result_idx != -1 and result_idx < len(row) and row[result_idx] else ""
+                rows_to_process = []
+                if "\n" in raw_item_cell:
+                    split_items = [x.strip() for x in raw_item_cell.split('\n') if x.strip()]
+                    if "\n" in raw_result_cell:
+                        split_results = [x.strip() for x in raw_result_cell.split('\n') if x.strip()]
+                    else:
+                        split_results = [raw_result_cell.strip()] if raw_result_cell.strip() else []
+                    if len(split_items) > 1 and len(split_results) == 1:
+                        for si in split_items:
+                            virtual_row = list(row)
+                            virtual_row[item_idx] = si
+                            if result_idx != -1: virtual_row[result_idx] = split_results[0]
+                            rows_to_process.append(virtual_row)
+                    elif len(split_items) == len(split_results):
+                        for si, sr in zip(split_items, split_results):
+                            virtual_row = list(row)
+                            virtual_row[item_idx] = si
+                            if result_idx != -1: virtual_row[result_idx] = sr
+                            rows_to_process.append(virtual_row)
+                    else:
+                        rows_to_process.append(row)
+                else:
+                    rows_to_process.append(row)
+                for proc_row in rows_to_process:
+                    clean_row = [clean_text(cell) for cell in proc_row]
+                    row_txt = "".join(clean_row).lower()
+                    if "test item" in row_txt or "result" in row_txt: continue
+                    if not any(clean_row): continue
+                    target_item_col = item_idx if item_idx != -1 else 0
+                    if target_item_col >= len(clean_row): continue
+                    item_name = clean_row[target_item_col]
+                    item_name_lower = item_name.lower()
+                    simple_keys, group_keys = ANALYTE_RULES.classify(item_name_lower, "standard")
+                    if not simple_keys and not group_keys: continue
+                    result = ""
+                    if result_idx != -1 and result_idx < len(clean_row):
+                        result = clean_row[result_idx]
+                    if result == "" and force_scan:
+                        for cell in reversed(clean_row):
+                            c_lower = cell.lower()
+                            if "mg/kg" in c_lower or "ppm" in c_lower: continue
+                            if "nd" in c_lower or "n.d." in c_lower:
+                                result = cell
+                                break
+                            if re.search(r"^\d+(\.\d+)?", cell):
+                                if is_suspicious_limit_value(cell): continue
+                                result = cell
+                                break
+                    is_sum_row = "sum of" in item_name_lower or "之和" in item_name_lower or "总和" in item_name_lower
+                    if is_sum_row:
+                         result = "" 
+                         for cell in reversed(clean_row):
+                            c_lower = cell.lower()
+                            if c_lower in ["1000", "100", "50", "10", "mg/kg", "ppm", "-"]: continue
+                            if "nd" in c_lower or "n.d." in c_lower:
+                                result = cell
+                                break
+                            if re.search(r"^\d+(\.\d+)?", cell):
+                                if is_suspicious_limit_value(cell): continue
+                                result = cell
+                                break
+                    if not is_sum_row:
+                        if mdl_idx != -1 and mdl_idx < len(clean_row):
+                            mdl_val = clean_text(clean_row[mdl_idx])
+                            if result == mdl_val and result != "":
+                                result = "" 
+                    temp_priority = parse_value_priority(result)
+                    if temp_priority[0] == 0:
+                        for cell in reversed(clean_row):
+                            c_lower = cell.lower()
+                            if not cell: continue
+                            if "nd" in c_lower or "n.d." in c_lower or "negative" in c_lower:
+                                result = cell
+                                break
+                            if re.search(r"^\d+(\.\d+)?", cell):
+                                if is_suspicious_limit_value(cell): continue
+                                result = cell
+                                break
+                    priority = parse_value_priority(result)
+                    if priority[0] == 0: continue
+                    for target_key in simple_keys:
+                        data_pool.add(target_key, priority)
+                    for group_key in group_keys:
+                        file_group_data.add(group_key, priority)
+        if early and early.page_done(i, [data_pool, file_group_data]): break
+    if not all(data_pool.has(h) for h in ["F", "CL", "BR", "I"]):
+        pages = range(early.last_page + 1) if early and early.last_page is not None else None # 提前結束時不再翻後面的頁面
+        with doc.timer.stage("halogen_block"): process_halogen_block(doc, filename, data_pool, pages)
+    if company == "SGS":
+        trigger_rescue = False
+        if not data_pool.has("Pb"): trigger_rescue = True
+        if ("halogen" in full_text_content.lower() or "卤素" in full_text_content) and not any(data_pool.has(h) for h in ["F", "CL", "BR", "I"]):
+            trigger_rescue = True
+        if "pfos" in full_text_content.lower() and not data_pool.has("PFOS"):
+            trigger_rescue = True
+        if trigger_rescue:
+             with doc.timer.stage("text_rescue"):
+                 parse_text_lines_v60(full_text_content, data_pool, file_group_data, filename, company, targets=None)
+    for group_key, best_in_file in file_group_data.items():
+        data_pool.add(group_key, best_in_file)
+    return data_pool, file_dates_candidates
+
+def clean_intertek_value(val):
+    if not val: return ""
+    cleaned = re.sub(r'\s*\(.*?\)', '', val)
+    return cleaned.strip()
+
+@template_cache
+def intertek_header_columns(header):
+    """Intertek 表頭 (第一列) -> (項目欄, 結果欄)；沒有結果表頭時取 RL/MDL 欄的左一欄，仍無則為 -1"""
+    rl_col_idx = -1
+    item_col_idx = -1
+    for c in range(len(header)):
+        h = clean_text(header[c]).lower()
+        if "rl" in h or "reporting limit" in h or "mdl" in h or "loq" in h:
+            rl_col_idx = c
+            break
+    for c in range(len(header)):
+        h = str(header[c]).lower()
+        if "test item" in h or "測試項目" in h or "시험항목" in h:
+            item_col_idx = c
+            break
+    if item_col_idx == -1: item_col_idx = 0
+    result_col_idx = -1
+    for c in range(len(header)):
+        h = str(header[c]).lower()
+        if "result" in h or "結果" in h or "submitted samples" in h or "시험결과" in h:
+            result_col_idx = c
+            break
+    if result_col_idx == -1 and rl_col_idx != -1:
+        result_col_idx = rl_col_idx - 1 
+    return item_col_idx, result_col_idx
+
+def process_intertek_engine(doc, filename, early_exit=False):
+    data_pool = AnalytePool()
+    if early_exit:
+        # 提前結束模式不預先擷取全部頁面的文字：日期只需前 2000 字，PFAS 與目標分析物改用 marker_text (不做版面分析)
+        head = ""
+        for i in range(doc.page_count):
+            if len(head) >= 2000: break
+            head += doc.text(i) + "\n"
+        full_text_content = "".join(doc.marker_text(i) + "\n" for i in range(doc.page_count))
+    else:
+        full_text_content = ""
+        for i in range(doc.page_count):
+            full_text_content += doc.text(i) + "\n"
+        head = full_text_content
+    if "per- and polyfluoroalkyl substances" in full_text_content.lower() or "pfas" in full_text_content.lower():
+        data_pool.add("PFAS", (4, 0, "REPORT"))
+    with doc.timer.stage("dates"): date_candidates = scan_dates(head[:2000], "intertek")
+    has_pbde_sub_nd = False
+    has_pbb_sub_nd = False 
+    early = EarlyExit(full_text_content, [data_pool], doc, "intertek") if early_exit else None
+    for i in range(doc.page_count):
+        tables = doc.tables(i)
+        for table in tables:
+            if not table or len(table) < 2: continue
+            (item_col_idx, result_col_idx), hit = intertek_header_columns(tuple(table[0]))
+            doc.counters["template_hits" if hit else "template_misses"] += 1
+            for r_idx, row in enumerate(table):
+                if len(row) <= item_col_idx: continue
+                item_text_raw = clean_text(row[item_col_idx])
+                item_text_lower = item_text_raw.lower()
+                is_pb_sum = "polybrominated" in item_text_lower and ("biphenyls" in item_text_lower or "ether" in item_text_lower)
+                result_text = ""
+                if result_col_idx != -1 and result_col_idx < len(row):
+                    result_text = clean_text(row[result_col_idx])
+                if is_pb_sum and not result_text:
+                    if r_idx + 1 < len(table):
+                        next_row = table[r_idx + 1]
+                        if result_col_idx != -1 and result_col_idx < len(next_row):
+                            next_val = clean_text(next_row[result_col_idx])
+                            if "nd" in next_val.lower():
+                                result_text = "N.D."
+                    if not result_text:
+                         for cell in reversed(row):
+                            c_lower = clean_text(cell).lower()
+                            if "nd" in c_lower or "n.d." in c_lower:
+                                result_text = "N.D."
+                                break
+                if not result_text and not is_pb_sum: 
+                    if ("brominated" in item_text_lower and "ether" in item_text_lower) or "monobde" in item_text_lower or "decabde" in item_text_lower or "모노브로모디페닐에테르" in item_text_raw:
+                         sub_res = ""
+                         if result_col_idx != -1 and result_col_idx < len(row):
+                             sub_res = clean_text(row[result_col_idx])
+                         if "nd" in sub_res.lower():
+                             has_pbde_sub_nd = True
+                    elif ("brominated" in item_text_lower and "biphenyl" in item_text_lower) or "monobb" in item_text_lower or "decabb" in item_text_lower or "모노브로모비페닐" in item_text_raw:
+                         sub_res = ""
+                         if result_col_idx != -1 and result_col_idx < len(row):
+                             sub_res = clean_text(row[result_col_idx])
+                         if "nd" in sub_res.lower():
+                             has_pbb_sub_nd = True
+                    continue
+                result_text = clean_intertek_value(result_text)
+                prio = parse_value_priority(result_text)
+                if prio[0] == 0: continue
+                simple_keys, group_keys = ANALYTE_RULES.classify(item_text_lower, "intertek")
+                for key in simple_keys + group_keys:
+                    data_pool.add(key, prio)
+        if early and early.page_done(i, [data_pool]): break
+    if not data_pool.has("PBDE") and has_pbde_sub_nd:
+        data_pool.add("PBDE", (1, 0, "N.D."))
+    if not data_pool.has("PBB") and has_pbb_sub_nd:
+        data_pool.add("PBB", (1, 0, "N.D."))
+    return data_pool, date_candidates
+
+# =============================================================================
+# 9. 智慧整合邏輯 (v63.46 新增防呆機制)
+# =============================================================================
+
+def get_value_score(val_str):
+    """
+    評估數值優先級:
+    3: 數值 (Max Logic)
+    2: NEGATIVE
+    1: N.D.
+    0: Empty / Invalid
+    Returns: (type_score, float_value)
+    """
+    val_str = str(val_str).strip().upper()
+    if not val_str: return (0, 0)
+    
+    # Check for N.D. variants
+    if "N.D." in val_str or "ND" in val_str or "<" in val_str: return (1, 0)
+    
+    # Check for NEGATIVE
+    if "NEGATIVE" in val_str or "陰性" in val_str: return (2, 0)
+    
+    # Check for Number
+    try:
+        # Remove any non-numeric chars except dot
+        clean_num = re.sub(r"[^\d\.]", "", val_str)
+        f = float(clean_num)
+        return (3, f)
+    except:
+        return (0, 0)
+
+def compare_chemical_values(v1, v2):
+    """回傳較大/較高風險的值"""
+    s1 = get_value_score(v1)
+    s2 = get_value_score(v2)
+    
+    # 比較類型優先級 (數值 > NEGATIVE > ND > Empty)
+    if s1[0] > s2[0]: return v1
+    if s2[0] > s1[0]: return v2
+    
+    # 若類型相同且為數值，比大小
+    if s1[0] == 3:
+        return v1 if s1[1] >= s2[1] else v2
+    
+    # 若類型相同且非數值 (如都是 ND)，回傳 v1
+    return v1
+
+def read_upload(file):
+    """取得上傳檔 (或任何檔案物件) 的位元組內容"""
+    if hasattr(file, "getvalue"): return file.getvalue()
+    file.seek(0)
+    return file.read()
+
+# 報告編號：首頁第一個「Report No. / Report Number / 報告編號」後、含數字的編號 (文字已轉大寫)；
+# 單獨的「Number :」(Intertek 首頁) 只在行首、須有冒號且編號同時含英文字母，避免誤取電話、傳真或頁數
+REPORT_NO_PATTERN = re.compile(r"(?:(?:REPORT\s*NO\.?|REPORT\s*NUMBER|報告編號|报告编号)\s*[:：]?|^\s*NUMBER\s*[:：](?=\s*[0-9/\-\.]*[A-Z]))"
+                               r"\s*((?=[A-Z0-9/\-\.]*\d)[A-Z0-9][A-Z0-9/\-\.]{5,})", re.M)
+
+def report_number(data):
+    """以 PDFium 只讀首頁文字取得報告編號 (不做版面分析，每檔約數 ms)；找不到或無法開啟時回傳 None"""
+    try:
+        pdf = PdfiumText(data)
+        try:
+            text = pdf.text(0)
+        finally:
+            pdf.close()
+    except Exception:
+        return None
+    m = REPORT_NO_PATTERN.search(text.upper())
+    return m.group(1).rstrip(".") if m else None
+
+def find_duplicates(entries, by_report=False, report_numbers=None):
+    """entries: [(檔名, 內容雜湊, 位元組)]，依順序找出重複檔，回傳 {索引: 說明}；每組重複只保留最先出現的檔案
+    內容雜湊相同一律視為重複 (結果必然相同，略過不影響整合)；by_report 時另以報告編號比對 (同一報告另存成不同的檔案)
+    report_numbers: 內容雜湊 -> 報告編號的 dict，重複呼叫時沿用已讀取的編號
+    """
+    report_numbers = {} if report_numbers is None else report_numbers
+    by_hash, by_number, duplicates = {}, {}, {}
+    for idx, (name, file_hash, data) in enumerate(entries):
+        if file_hash in by_hash:
+            duplicates[idx] = f"與 {by_hash[file_hash]} 內容相同"
+            continue
+        by_hash[file_hash] = name
+        if not by_report: continue
+        if file_hash not in report_numbers:
+            report_numbers[file_hash] = report_number(data)
+        number = report_numbers[file_hash]
+        if number is None: continue
+        if number in by_number:
+            duplicates[idx] = f"與 {by_number[number]} 報告編號相同 ({number})"
+        else:
+            by_number[number] = name
+    return duplicates
+
+def rename_outcome(outcome, filename):
+    """沿用其他檔案的 (狀態, 內容, 計數)：檔名改為 filename，計數清空 (與 ResultCache.get 相同)"""
+    status, payload, _ = outcome
+    if status == "ok": return "ok", payload.renamed(filename), {}
+    return status, filename if status == "unreadable" else payload, {}
+
+class FileRecord:
+    """單檔結果 (parse_pdf_file 狀態 "ok" 的內容)：各分析物的輸出值與 get_value_score 依 ANALYTE_KEYS 順序存於 values / scores
+    get() 以原本單檔 dict 的鍵取值 (File Name / Date / DateObj / Company / Engine / 分析物 / "分析物_score")，to_dict() 轉回該格式
+    """
+    __slots__ = ("filename", "date", "date_obj", "company", "engine", "values", "scores")
+    FIELDS = {"File Name": "filename", "Date": "date", "DateObj": "date_obj", "Company": "company", "Engine": "engine"}
+
+    def __init__(self, filename, date, date_obj, values, scores, company="", engine=""):
+        self.filename = filename
+        self.date = date
+        self.date_obj = date_obj
+        self.values = values
+        self.scores = scores
+        self.company = company
+        self.engine = engine
+
+    def get(self, key, default=None):
+        if key in self.FIELDS: return getattr(self, self.FIELDS[key])
+        if key.endswith("_score") and key[:-6] in ANALYTE_INDEX: return self.scores[ANALYTE_INDEX[key[:-6]]]
+        if key in ANALYTE_INDEX: return self.values[ANALYTE_INDEX[key]]
+        return default
+
+    def renamed(self, filename):
+        """檔名不同、其餘相同的結果 (結果快取 / 重複檔沿用)；values / scores 不會被修改，直接共用"""
+        return FileRecord(filename, self.date, self.date_obj, self.values, self.scores, self.company, self.engine)
+
+    def to_dict(self):
+        result = {"File Name": self.filename, "Date": self.date, "DateObj": self.date_obj}
+        for k, value, score in zip(ANALYTE_KEYS, self.values, self.scores):
+            result[k] = value
+            result[f"{k}_score"] = score
+        result["Company"] = self.company
+        result["Engine"] = self.engine
+        return result
+
+    def __eq__(self, other):
+        return isinstance(other, FileRecord) and all(getattr(self, a) == getattr(other, a) for a in self.__slots__)
+
+    def __repr__(self):
+        return f"FileRecord({self.to_dict()!r})"
+
+def build_file_result(filename, data_pool, date_candidates):
+    """將引擎輸出 (AnalytePool, 日期候選) 整理為單檔結果 FileRecord"""
+    # 日期：分數最高者，同分取較晚的日期 (再同分保留先出現者)
+    valid_dates = [d for d in date_candidates if d[0] > -50]
+    if valid_dates:
+        best_date = max(valid_dates, key=lambda x: (x[0], x[1]))[1]
+        date, date_obj = best_date.strftime("%Y/%m/%d"), best_date
+    else:
+        date, date_obj = "", datetime.min
+
+    # 化學數值
+    values, scores = [], []
+    for best in data_pool.best:
+        if best is None:
+            values.append("")
+            scores.append((0, 0))
+        else:
+            value = format_output_value(best[2])
+            values.append(value)
+            scores.append(get_value_score(value))
+    return FileRecord(filename, date, date_obj, values, scores)
+
+SCAN_TEXT_THRESHOLD = 50 # 前兩頁文字少於此字數視為掃描檔
+
+def is_scanned_pdf(doc):
+    """前兩頁文字不足門檻即為掃描/純圖片檔
+    先數字元層的非空白字元 (不做版面分析)，達門檻立即判定為文字檔；完全沒有字元則直接判定為掃描檔；
+    只有介於兩者之間時才退回以 extract_text 判定，結果與逐頁 extract_text 相同
+    """
+    pages = range(min(2, doc.page_count))
+    total = 0
+    for i in pages:
+        total += doc.char_count(i, SCAN_TEXT_THRESHOLD - total)
+        if total >= SCAN_TEXT_THRESHOLD: return False
+    if total == 0: return True
+    all_text = "".join(doc.text(i) for i in pages)
+    return len(all_text.strip()) < SCAN_TEXT_THRESHOLD
+
+def route_engine(first_page_text):
+    """依首頁文字 (大寫) 決定引擎，回傳 (引擎名稱, 公司)"""
+    company = identify_company(first_page_text)
+    if "MALAYSIA" in first_page_text and "SGS" in first_page_text: return "MALAYSIA", company
+    if company == "CTI": return "CTI", company
+    if company == "INTERTEK": return "INTERTEK", company
+    return "STANDARD", company
+
+def run_engine(engine, doc, filename, company, early_exit=False):
+    """執行 route_engine 選出的引擎，回傳 (data_pool, 日期候選)"""
+    if engine == "MALAYSIA":
+        return process_malaysia_engine(doc, filename)
+    if engine == "CTI":
+        return process_cti_engine(doc, filename)
+    if engine == "INTERTEK":
+        return process_intertek_engine(doc, filename, early_exit)
+    return process_standard_engine(doc, filename, company, early_exit)
+
+def parse_pdf_file(filename, data, early_exit=False):
+    """解析單一 PDF (可在子行程中執行)
+    early_exit: 標準 / Intertek 引擎在目標分析物都有數值後提前停止翻頁 (見 EarlyExit)
+    Returns: (狀態, 內容, 頁面快取計數 + 各階段耗時 "stage_ms")
+      狀態 "ok": 內容為單檔結果 FileRecord
+      狀態 "unreadable": 掃描檔，內容為檔名
+      狀態 "error": 內容為錯誤訊息
+      狀態 "skipped": 超出資源上限或已取消，內容為原因 (見 iter_parse_files)
+    (另有 "duplicate"：重複檔不解析，內容為說明，由 iter_batch / BackgroundParser 產生，見 find_duplicates)
+    """
+    if ARTIFACT_DIR: return parse_artifact(filename, data, early_exit)
+    timer = StageTimer()
+    counters = {"stage_ms": timer.ms}
+    try:
+        with timer.stage("open"):
+            pdf = pdfplumber.open(io.BytesIO(data))
+        with pdf:
+            with timer.stage("open"):
+                doc = PageCache(pdf, timer, text_backend=PdfiumText(data) if TEXT_BACKEND == "pdfium" else None, data=data)
+            counters = doc.counters
+            counters["stage_ms"] = timer.ms
+            try:
+                status, payload = parse_doc(filename, doc, early_exit)
+                return status, payload, counters
+            finally:
+                doc.close()
+    except MemoryError:
+        return "skipped", "記憶體超過上限", counters
+    except Exception as e:
+        return "error", str(e), counters
+
+def parse_doc(filename, doc, early_exit=False):
+    """掃描檔判定 -> 路由 -> 引擎 -> 單檔結果；doc 為 PageCache 或 ArtifactDoc，回傳 (狀態, 內容)"""
+    timer = doc.timer
+    # [v63.46 Fix] 防呆檢查：文字密度過低則視為掃描檔
+    with timer.stage("scan_check"):
+        if is_scanned_pdf(doc):
+            return "unreadable", filename
+
+    # 正常解析流程
+    with timer.stage("route"):
+        engine, company = route_engine(doc.text(0).upper())
+    doc.prefetch_tables = engine != "MALAYSIA" # 馬來西亞引擎只讀文字
+    with timer.stage("engine"):
+        data_pool, date_candidates = run_engine(engine, doc, filename, company, early_exit)
+
+    with timer.stage("build"):
+        file_result = build_file_result(filename, data_pool, date_candidates)
+    file_result.company = company
+    file_result.engine = engine
+    return "ok", file_result
+
+def _address_space():
+    """目前行程的虛擬記憶體大小 (bytes)；無 /proc 時回傳 0"""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+MEMORY_POLL_INTERVAL = 0.1 # 有記憶體上限時檢查子行程常駐記憶體的間隔 (秒)
+
+def _resident(pid):
+    """行程的常駐記憶體 (bytes)；無 /proc 或行程已結束時回傳 None"""
+    try:
+        with open(f"/proc/{pid}/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _budget_worker(conn, filename, data, early_exit, memory_mb):
+    """獨立子行程：設定記憶體上限 (以子行程啟動時的虛擬記憶體為基準再加 memory_mb) 後解析單一檔案，結果經 Pipe 傳回
+    RLIMIT_AS 限制的是虛擬位址空間：基準內已保留但未使用的空間 (配置器保留區等，可達數百 MB) 不受限制，只作為失控時的硬上限；
+    實際用量由主行程以常駐記憶體 (_resident) 相對子行程啟動時的基準檢查
+    """
+    if memory_mb and resource is not None:
+        limit = _address_space() + int(memory_mb * 1024 * 1024)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    conn.send(parse_pdf_file(filename, data, early_exit))
+    conn.close()
+
+def _budget_context():
+    """獨立子行程的啟動方式：不直接由 (多執行緒的) 主行程 fork，避免複製到其他執行緒持有中的鎖而卡死
+    forkserver 只啟動一次並以模組名稱預先匯入本模組 (不匯入 __main__：Streamlit 下為每次重新執行替換的頁面腳本)，
+    之後每個檔案由單執行緒的 forkserver fork，啟動成本與 fork 相近；子行程的記憶體基準也是精簡的 forkserver 而非主行程。
+    不支援 forkserver 的平台 (Windows) 改用 spawn
+    """
+    if "forkserver" not in multiprocessing.get_all_start_methods(): return multiprocessing.get_context("spawn")
+    ctx = multiprocessing.get_context("forkserver")
+    ctx.set_forkserver_preload([__name__])
+    return ctx
+
+def _iter_isolated(jobs, workers, early_exit, timeout, memory_mb, cancel):
+    """每個檔案在獨立子行程中解析 (最多 workers 個同時)，超過時間上限或取消時直接終止子行程"""
+    ctx = _budget_context()
+    queue = list(enumerate(jobs))
+    running = {} # Pipe -> (索引, 子行程, 截止時間)
+    rss_base = {} # Pipe -> 子行程啟動時的常駐記憶體 (記憶體上限的基準)
+    try:
+        while queue or running:
+            if cancel is not None and cancel.is_set():
+                for conn, (idx, proc, _) in list(running.items()):
+                    proc.kill()
+                    yield idx, ("skipped", "已取消", {})
+                for idx, _ in queue: yield idx, ("skipped", "已取消", {})
+                return
+            while queue and len(running) < max(1, workers):
+                idx, (name, data) = queue.pop(0)
+                recv, send = ctx.Pipe(duplex=False)
+                proc = ctx.Process(target=_budget_worker, args=(send, name, data, early_exit, memory_mb), daemon=True)
+                proc.start()
+                send.close()
+                running[recv] = (idx, proc, time.monotonic() + timeout if timeout else None)
+                if memory_mb: rss_base[recv] = _resident(proc.pid)
+            deadlines = [deadline for _, _, deadline in running.values() if deadline]
+            wait = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            if cancel is not None: wait = 0.5 if wait is None else min(wait, 0.5) # 定期檢查是否取消
+            if memory_mb and any(base is not None for base in rss_base.values()):
+                wait = MEMORY_POLL_INTERVAL if wait is None else min(wait, MEMORY_POLL_INTERVAL)
+            for conn in multiprocessing.connection.wait(list(running), wait):
+                idx, proc, _ = running.pop(conn)
+                rss_base.pop(conn, None)
+                try:
+                    outcome = conn.recv()
+                except (EOFError, OSError): # 子行程未傳回結果即結束 (有記憶體上限時通常是超過上限，否則為解析程式庫崩潰)
+                    proc.join()
+                    if memory_mb:
+                        outcome = ("skipped", f"解析行程異常結束 (exit code {proc.exitcode})，可能超過記憶體上限", {})
+                    else:
+                        outcome = ("error", f"解析行程異常結束 (exit code {proc.exitcode})", {})
+                conn.close()
+                proc.join()
+                yield idx, outcome
+            now = time.monotonic()
+            for conn, (idx, proc, deadline) in list(running.items()):
+                base = rss_base.get(conn)
+                rss = _resident(proc.pid) if base is not None else None
+                if deadline and now >= deadline:
+                    reason = f"超過時間上限 {timeout:g}s"
+                elif rss is not None and rss - base > memory_mb * 1024 * 1024:
+                    reason = f"超過記憶體上限 {memory_mb:g} MB"
+                else:
+                    continue
+                del running[conn]
+                rss_base.pop(conn, None)
+                proc.kill()
+                proc.join()
+                conn.close()
+                yield idx, ("skipped", reason, {})
+    finally:
+        for conn, (_, proc, _) in running.items(): # 產生器提前關閉時不留下子行程
+            proc.kill()
+            proc.join()
+            conn.close()
+
+def iter_parse_files(jobs, workers=1, early_exit=False, timeout=None, memory_mb=None, cancel=None):
+    """解析多個 (檔名, 位元組) 工作，依完成先後逐一產生 (索引, 結果)
+    timeout / memory_mb: 單檔時間 (秒) / 記憶體 (MB) 上限；任一設定時每個檔案在獨立子行程中解析，超過即終止並回傳 "skipped"
+    cancel: threading.Event，設定後尚未完成的檔案回傳 ("skipped", "已取消")；
+            沒有資源上限時無法中斷解析中的檔案，只在檔案之間檢查
+    """
+    if timeout or memory_mb:
+        yield from _iter_isolated(jobs, workers, early_exit, timeout, memory_mb, cancel)
+        return
+    finished = set()
+    if workers > 1 and len(jobs) > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+                futures = {pool.submit(parse_pdf_file, name, data, early_exit): idx for idx, (name, data) in enumerate(jobs)}
+                for future in as_completed(futures):
+                    outcome = future.result()
+                    finished.add(futures[future])
+                    yield futures[future], outcome
+                    if cancel is not None and cancel.is_set():
+                        pool.shutdown(wait=False, cancel_futures=True)
+                        break
+        except BrokenProcessPool:
+            # 子行程異常終止 (例如 pdfium / pdfminer 崩潰)：尚未完成的檔案 (含造成崩潰者) 各以獨立子行程重試，
+            # 不在本行程內解析，避免同一檔案讓 Streamlit 伺服器 / 命令列行程崩潰；再次異常終止的檔案回傳 "error"
+            retry = [idx for idx in range(len(jobs)) if idx not in finished]
+            for n, outcome in _iter_isolated([jobs[idx] for idx in retry], workers, early_exit, None, None, cancel):
+                finished.add(retry[n])
+                yield retry[n], outcome
+    for idx, (name, data) in enumerate(jobs):
+        if idx in finished: continue
+        if cancel is not None and cancel.is_set():
+            yield idx, ("skipped", "已取消", {})
+        else:
+            yield idx, parse_pdf_file(name, data, early_exit)
+
+def parse_files(jobs, workers=1, early_exit=False):
+    """解析多個 (檔名, 位元組) 工作，結果順序與輸入一致 (與完成先後無關)"""
+    outcomes = [None] * len(jobs)
+    for idx, outcome in iter_parse_files(jobs, workers, early_exit):
+        outcomes[idx] = outcome
+    return outcomes
+
+def aggregate_batch(batch_raw_data, item_index):
+    """將多個單檔結果 (FileRecord) 整合為一列 (最大值 / 最新日期 / Pb 優先檔名)"""
+    aggregated_row = {"ITEM": item_index}
+    
+    # (A) 數值整合: 取最大值 (與逐一 compare_chemical_values 相同：類型優先、同為數值比大小、同分保留先出現者；
+    #     各檔的分數在 FileRecord 中已算好，不再重複解析數值文字)
+    for i, k in enumerate(ANALYTE_KEYS):
+        best_val, best_score = "", (0, 0)
+        for d in batch_raw_data:
+            score = d.scores[i]
+            if score[0] > best_score[0] or (score[0] == best_score[0] == 3 and score[1] > best_score[1]):
+                best_val, best_score = d.values[i], score
+        
+        display_key = COLUMN_MAPPING.get(k, k)
+        aggregated_row[display_key] = best_val
+
+    # (B) 日期整合: 取最新日期
+    latest_date_obj = datetime.min
+    latest_date_str = ""
+    for d in batch_raw_data:
+        if d.date_obj > latest_date_obj:
+            latest_date_obj = d.date_obj
+            latest_date_str = d.date
+    aggregated_row["Date"] = latest_date_str
+
+    # (C) 檔名整合: Pb 優先決
+    pb = ANALYTE_INDEX["Pb"]
+    best_file_name = batch_raw_data[0].filename
+    max_pb_score = (-1, -1)
+    for d in batch_raw_data:
+        s = d.scores[pb]
+        if s[0] > max_pb_score[0]:
+            max_pb_score = s
+        elif s[0] == max_pb_score[0] and s[1] > max_pb_score[1]:
+            max_pb_score = s
+            
+    candidates = [d for d in batch_raw_data if d.scores[pb] == max_pb_score]
+    if candidates:
+        best_candidate = sorted(candidates, key=lambda x: x.date_obj, reverse=True)[0]
+        best_file_name = best_candidate.filename
+        
+    aggregated_row["File Name"] = best_file_name
+    return aggregated_row
+
+def iter_batch(files, workers=1, cache=None, early_exit=False, timer=None, timeout=None, memory_mb=None, cancel=None,
+               dedupe_reports=False):
+    """逐檔產生 (索引, 檔名, (狀態, 內容, 計數), 結果快取狀態)：重複檔與結果快取命中的檔案先產生，其餘依解析完成先後產生
+    結果快取狀態為 "hit" / "miss" / "duplicate"，未使用結果快取時為 None (重複檔仍為 "duplicate")
+    timer 記錄 read / dedupe / result_cache / parse 階段
+    timeout / memory_mb / cancel: 單檔資源上限與取消 (見 iter_parse_files)
+    dedupe_reports: 報告編號相同的檔案也視為重複 (見 find_duplicates)；內容相同的檔案一律只解析一次
+    """
+    timer = timer or StageTimer()
+    with timer.stage("read"):
+        jobs = [(file.name, read_upload(file)) for file in files]
+    with timer.stage("dedupe"):
+        duplicates = find_duplicates([(name, hashlib.sha256(data).hexdigest(), data) for name, data in jobs], dedupe_reports)
+    for idx, message in duplicates.items():
+        yield idx, jobs[idx][0], ("duplicate", message, {}), "duplicate"
+    keys = [None] * len(jobs)
+    pending = []
+    for idx, (name, data) in enumerate(jobs):
+        if idx in duplicates: continue
+        outcome = None
+        if cache is not None:
+            with timer.stage("result_cache"):
+                keys[idx] = cache.key(data, early_exit)
+                outcome = cache.get(keys[idx], name)
+        if outcome is None:
+            pending.append(idx)
+        else:
+            yield idx, name, outcome, "hit"
+    with timer.stage("parse"):
+        for n, outcome in iter_parse_files([jobs[idx] for idx in pending], workers, early_exit, timeout, memory_mb, cancel):
+            idx = pending[n]
+            if cache is not None:
+                with timer.stage("result_cache"): cache.put(keys[idx], outcome[0], outcome[1])
+            yield idx, jobs[idx][0], outcome, "miss" if cache is not None else None
+
+def process_batch(files, item_index, stats=None, workers=1, cache=None, early_exit=False, errors=None, timings=None,
+                  timeout=None, memory_mb=None, skipped=None, outcomes=None, duplicates=None, dedupe_reports=False):
+    """處理單一批次檔案，回傳 (整合後的單列資料, 無法讀取的檔名列表)
+    stats: 若傳入 list，逐檔附加頁面快取的命中/未命中計數與各階段耗時 (stage_ms)
+    workers: 大於 1 時以多行程平行解析各檔案，輸出與循序模式完全相同
+    cache: ResultCache，命中的檔案直接沿用先前結果，不再開啟 pdfplumber
+    early_exit: 選用的提前結束模式 (見 EarlyExit)，結果以不同的快取鍵儲存
+    errors: 若傳入 list，解析失敗的 (檔名, 錯誤訊息) 附加於此而不在頁面顯示 (命令列模式)
+    timings: 若傳入 dict，寫入批次層級各階段耗時 (ms)：read / result_cache / parse / aggregate
+    timeout / memory_mb: 單檔時間 (秒) / 記憶體 (MB) 上限，超過的檔案略過 (見 iter_parse_files)
+    skipped: 若傳入 list，略過的 (檔名, 原因) 附加於此；否則以「檔名 (原因)」列入無法讀取清單
+    outcomes: 若傳入 list，依檔案順序附加各檔的 (狀態, 內容, 計數) (供 history_records 使用)
+    duplicates / dedupe_reports: 重複檔不解析、不列入整合 (見 find_duplicates)；若傳入 list，附加 (檔名, 說明)
+    需要逐檔進度時改用 iter_batch，再以 finish_batch 整合
+    """
+    timer = StageTimer()
+    names = [file.name for file in files]
+    file_outcomes = [None] * len(files)
+    cache_flags = [None] * len(files)
+    for idx, _, outcome, cache_flag in iter_batch(files, workers, cache, early_exit, timer, timeout, memory_mb,
+                                                  dedupe_reports=dedupe_reports):
+        file_outcomes[idx] = outcome
+        cache_flags[idx] = cache_flag
+    if outcomes is not None: outcomes.extend(file_outcomes)
+    return finish_batch(names, file_outcomes, item_index, stats, errors, timings, cache_flags if cache is not None else None, timer,
+                        skipped, duplicates)
+
+def finish_batch(names, outcomes, item_index, stats=None, errors=None, timings=None, cache_flags=None, timer=None,
+                 skipped=None, duplicates=None):
+    """由各檔的 (狀態, 內容, 計數) 產生 (整合後的單列資料, 無法讀取的檔名列表)；process_batch 與背景解析共用
+    cache_flags: 各檔的結果快取命中狀態 ("hit" / "miss")，None = 未使用結果快取
+    skipped: 若傳入 list，超出資源上限或已取消的 (檔名, 原因) 附加於此；否則以「檔名 (原因)」列入無法讀取清單
+    duplicates: 若傳入 list，重複檔的 (檔名, 說明) 附加於此；重複檔一律不列入整合
+    errors: 若傳入 list，解析失敗的 (檔名, 訊息) 附加於此；否則以「檔名 (解析失敗: 訊息)」列入無法讀取清單
+    """
+    batch_raw_data = []
+    unreadable_list = []
+    timer = timer or StageTimer()
+    for idx, (name, (status, payload, counters)) in enumerate(zip(names, outcomes)):
+        if stats is not None:
+            row_stats = {"File Name": name, "Engine": payload.get("Engine", "") if status == "ok" else "", **counters}
+            if cache_flags is not None: row_stats["result_cache"] = cache_flags[idx]
+            stats.append(row_stats)
+        if status == "ok":
+            batch_raw_data.append(payload)
+        elif status == "unreadable": # [v63.46 Fix] 無法讀取的掃描檔
+            unreadable_list.append(name) # 跳過此檔案，不進行解析
+        elif status == "skipped":
+            if skipped is not None: skipped.append((name, payload))
+            else: unreadable_list.append(f"{name} ({payload})")
+        elif status == "duplicate":
+            if duplicates is not None: duplicates.append((name, payload))
+        elif errors is not None:
+            errors.append((name, payload))
+        else:
+            unreadable_list.append(f"{name} (解析失敗: {payload})")
+
+    # 若全數為掃描檔或無有效檔案
+    if not batch_raw_data:
+        if timings is not None: timings.update(timer.ms)
+        return None, unreadable_list
+
+    # 2. 整合運算 (Aggregation)
+    with timer.stage("aggregate"):
+        row = aggregate_batch(batch_raw_data, item_index)
+    if timings is not None: timings.update(timer.ms)
+    return row, unreadable_list
+
+def table_skip_report(stats):
+    """依引擎彙總表格頁預分類的略過統計 (結果快取命中的檔案沒有計數，不列入)
+    預估節省時間 = 因無標記詞而略過的頁數 x 該引擎實際擷取頁的平均表格擷取時間；無框線頁的擷取本就近乎零成本，不列入預估
+    """
+    rows = [s for s in stats if "table_pages" in s]
+    if not rows: return pd.DataFrame()
+    df = pd.DataFrame(rows)
+    df["Engine"] = df["Engine"].replace("", "(未解析)")
+    report = df.groupby("Engine", sort=False).agg(
+        files=("File Name", "count"), table_pages=("table_pages", "sum"), skip_no_edges=("table_skip_no_edges", "sum"),
+        skip_no_markers=("table_skip_no_markers", "sum"), cropped=("table_pages_cropped", "sum"), table_ms=("table_ms", "sum"))
+    per_page = (report["table_ms"] / report["table_pages"].where(report["table_pages"] > 0)).fillna(0)
+    report["est_saved_ms"] = (report["skip_no_markers"] * per_page).round(1)
+    report["table_ms"] = report["table_ms"].round(1)
+    return report.reset_index()
+
+def stage_report(stats, batch_timings):
+    """各檔各階段耗時 + 批次層級耗時，可直接輸出為 JSON"""
+    files = []
+    for s in stats:
+        stage_ms = s.get("stage_ms") or {}
+        files.append({"file": s["File Name"], "engine": s.get("Engine", ""), "result_cache": s.get("result_cache", ""),
+                      "total_ms": round(sum(stage_ms.values()), 2),
+                      "stage_ms": {k: round(v, 2) for k, v in stage_ms.items()}})
+    return {"batch_ms": {k: round(v, 2) for k, v in batch_timings.items()}, "files": files}
+
+def profile_file(filename, data, early_exit=False, limit=40):
+    """以 cProfile 解析單一檔案 (本行程內，不經結果快取)，回傳 (依累計時間排序的 pstats 文字, .prof 位元組)"""
+    profiler = cProfile.Profile()
+    profiler.runcall(parse_pdf_file, filename, data, early_exit)
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(limit)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "profile.prof")
+        profiler.dump_stats(path)
+        with open(path, "rb") as fh:
+            return out.getvalue(), fh.read()
+
+# =============================================================================
+# 9.1 結果快取 (PDF 內容雜湊 + 引擎/規則版本)
+# =============================================================================
+
+RESULT_CACHE_DIR = os.environ.get("REPORT_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".result_cache"))
+RESULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+RESULT_CACHE_RESCAN_PUTS = 256 # 每寫入這麼多筆重新掃描目錄一次 (修正其他行程寫入造成的容量估計誤差)
+RESULT_CACHE_EVICT_TO = 0.9 # 淘汰到容量上限的此比例，避免接近上限時每次寫入都重新掃描
+
+# 各引擎依賴的規則 profile、關鍵字表與函式：任一項內容變更即令該引擎的快取失效
+# ("rules:名稱" 代表 rules.json 中該 profile 解析後的內容)
+SHARED_COMPONENTS = [
+    "INTERNAL_COLUMNS", "clean_text", "is_valid_date", "is_suspicious_limit_value", "parse_value_priority",
+    "format_output_value", "identify_company", "get_value_score", "KeywordMatcher", "RuleSet", "STREAM_MIN_PAGES", "TEXT_BACKEND", "PdfiumText", "PageCache", "EarlyExit",
+    "TABLE_PAGE_FILTER", "TABLE_PAGE_PADDING", "TABLE_CROP_MIN_OUTSIDE", "TABLE_PAGE_MARKER_TERMS", "LIGATURES",
+    "ANALYTE_KEYS", "AnalytePool", "FileRecord", "SCAN_TEXT_THRESHOLD", "is_scanned_pdf", "route_engine", "run_engine", "parse_doc", "has_table_markers", "ArtifactDoc", "MONTH_MAP", "DATE_PROFILES", "_date_rules", "_make_date",
+    "_scan_date_tokens", "_scan_date_lines", "_scan_date_anchor", "scan_dates", "build_file_result", "parse_pdf_file"
+]
+ENGINE_COMPONENTS = {
+    "MALAYSIA": ["rules:malaysia", "MY_MDL_BLOCKLIST", "MY_DEHP_CLEANUP", "MY_CONTEXT_CLEANUP", "MY_ND", "MY_NEGATIVE",
+                 "MY_NUMBER", "MalaysiaText", "extract_result_malaysia_v7", "process_malaysia_engine"],
+    "CTI": ["rules:cti", "cti_header_columns", "cti_mdl_from_data", "process_cti_engine"],
+    "INTERTEK": ["rules:intertek", "clean_intertek_value", "intertek_header_columns", "process_intertek_engine"],
+    "STANDARD": ["rules:standard", "rules:text", "rules:halogen_block", "PFAS_SUMMARY_KEYWORDS", "MSDS_HEADER_KEYWORDS",
+                 "identify_columns_v60", "_scan_header_row_v60", "parse_text_lines_v60", "process_halogen_block",
+                 "process_standard_engine"]
+}
+
+def components_version(names):
+    """以原始碼 / 資料內容計算版本雜湊"""
+    h = hashlib.sha256()
+    for name in names:
+        if name.startswith("rules:"):
+            src = ANALYTE_RULES.version(name[len("rules:"):])
+        else:
+            obj = globals()[name]
+            src = inspect.getsource(obj) if callable(obj) else repr(obj)
+        h.update(name.encode("utf-8") + b"\0" + src.encode("utf-8") + b"\0")
+    return h.hexdigest()[:16]
+
+@lru_cache(maxsize=None)
+def cache_versions():
+    """(共用版本, ((引擎, 版本), ...))：原始碼與規則在行程執行期間不變，每個行程只計算一次 (inspect.getsource 約需 1-2 秒)
+    回傳值可序列化，命令列模式在父行程計算後傳給子行程 (見 ResultCache 的 versions)
+    """
+    return components_version(SHARED_COMPONENTS), tuple((engine, components_version(names)) for engine, names in ENGINE_COMPONENTS.items())
+
+class ResultCache:
+    """磁碟結果快取：鍵為 PDF 位元組的 SHA-256 + 共用規則版本，超過容量上限時依最近使用時間 (LRU) 淘汰
+    versions: cache_versions() 的結果；None = 在本行程計算 (只有第一次需要時間)
+    """
+    def __init__(self, directory=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_BYTES, versions=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.shared_version, engine_versions = versions or cache_versions()
+        self.engine_versions = dict(engine_versions)
+        self._bytes = None # 目錄總容量的估計 (第一次寫入時掃描)，寫入時累加，超過上限才掃描淘汰
+        self._puts = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, data, early_exit=False):
+        return f"{hashlib.sha256(data).hexdigest()}-{self.shared_version}" + ("-early" if early_exit else "")
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".pkl")
+
+    def get(self, key, filename):
+        """命中時回傳 (狀態, 內容, {})，檔名改為本次上傳的名稱；未命中或版本不符回傳 None"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as fh:
+                entry = pickle.load(fh)
+        except (OSError, pickle.PickleError, EOFError):
+            return None
+        engine = entry.get("engine")
+        if engine and entry.get("engine_version") != self.engine_versions.get(engine):
+            try: os.remove(path)
+            except OSError: pass
+            return None
+        try: os.utime(path) # 更新最近使用時間 (LRU)
+        except OSError: pass
+        if entry["status"] == "ok":
+            return "ok", entry["payload"].renamed(filename), {}
+        return entry["status"], filename, {}
+
+    def put(self, key, status, payload):
+        if status not in ("ok", "unreadable"): return # 錯誤不快取，下次重試
+        engine = payload.get("Engine") if status == "ok" else None
+        entry = {
+            "status": status,
+            "payload": payload if status == "ok" else None,
+            "engine": engine,
+            "engine_version": self.engine_versions.get(engine)
+        }
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp" # 同一行程的多個執行緒可能同時寫入同一鍵
+        try:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            with open(tmp_path, "wb") as fh:
+                pickle.dump(entry, fh, protocol=pickle.HIGHEST_PROTOCOL)
+                size = fh.tell()
+            os.replace(tmp_path, path)
+        except OSError:
+            try: os.remove(tmp_path)
+            except OSError: pass
+            return
+        with self._lock:
+            self._puts += 1
+            if self._bytes is None or self._puts % RESULT_CACHE_RESCAN_PUTS == 0:
+                self._bytes = self._evict(self.max_bytes)
+            else:
+                self._bytes += size - old_size
+                if self._bytes > self.max_bytes: self._bytes = self._evict(int(self.max_bytes * RESULT_CACHE_EVICT_TO))
+
+    def _evict(self, limit):
+        """掃描目錄，依最近使用時間淘汰到總容量不超過 limit，回傳淘汰後的總容量"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".pkl"): continue
+            try:
+                info = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((info.st_mtime, info.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        if total <= limit: return total
+        for _, size, name in sorted(entries):
+            if total <= limit: break
+            try:
+                os.remove(os.path.join(self.directory, name))
+                total -= size
+            except OSError:
+                pass
+        return total
+
+# =============================================================================
+# 9.2 背景解析 (檔案上傳後立即解析)
+# =============================================================================
+
+class BackgroundParser:
+    """上傳後立即在背景執行緒解析，單檔結果依 (檔名, 內容雜湊, 提前結束) 保存在 session state；
+    新增或移除檔案時只解析新檔案，各檔完成即可取用 (outcome)，按下執行時只需整合 (finish_batch)
+    重複檔 (見 find_duplicates) 不提交解析；移出清單的檔案保留完成的結果，之後的 ITEM 再次上傳相同內容時直接沿用
+    """
+    RECENT_LIMIT = 256 # 保留的已完成結果數 (依移出順序淘汰)
+
+    def __init__(self, executor):
+        self.executor = executor
+        self._cancel = threading.Event() # 本次提交的背景工作共用；取消後換新的 Event，之後的提交不受影響
+        self.entries = {} # 鍵 -> {"future": 單檔 Future, "submitted": 提交時間, "finished": 完成時間} 或 {"outcome": 快取命中的結果}；另含 result_cache
+        self.duplicates = {} # 目前清單中的重複檔：鍵 -> 說明
+        self.recent = {} # (內容雜湊, 提前結束) -> 已移出清單的檔案的 (狀態, 內容, 計數)
+        self.report_numbers = {} # 內容雜湊 -> 報告編號 (find_duplicates 沿用)
+
+    @staticmethod
+    def key(name, data, early_exit=False):
+        return (name, hashlib.sha256(data).hexdigest(), early_exit)
+
+    def sync(self, jobs, workers=1, make_cache=None, early_exit=False, timeout=None, memory_mb=None, dedupe_reports=False):
+        """jobs: 目前上傳清單的 [(檔名, 位元組)]；提交尚未解析的檔案 (結果快取命中者直接取用)，
+        捨棄已不在清單中的檔案，回傳本批次各檔的鍵 (依上傳順序)
+        make_cache: 建立 ResultCache 的函式，None = 不使用結果快取；有新檔案時才建立
+        timeout / memory_mb: 單檔資源上限 (見 iter_parse_files)；超過或取消的檔案保留 "skipped" 結果，移除後重新上傳即重新解析
+        dedupe_reports: 報告編號相同的檔案也視為重複 (見 find_duplicates)
+        """
+        keys = [self.key(name, data, early_exit) for name, data in jobs]
+        current = set(keys)
+        for key in [k for k in self.entries if k not in current]:
+            outcome = self.outcome(key)
+            if outcome is not None and outcome[0] in ("ok", "unreadable"):
+                self.recent.pop(key[1:], None)
+                self.recent[key[1:]] = outcome
+                if len(self.recent) > self.RECENT_LIMIT: del self.recent[next(iter(self.recent))]
+            del self.entries[key] # 已開始的背景工作無法中止，完成後結果直接丟棄
+        hashes = {key[1] for key in keys}
+        self.report_numbers = {h: n for h, n in self.report_numbers.items() if h in hashes}
+        duplicates = find_duplicates([(name, key[1], data) for key, (name, data) in zip(keys, jobs)], dedupe_reports,
+                                     self.report_numbers)
+        self.duplicates = {keys[idx]: message for idx, message in duplicates.items()}
+        new = []
+        cache = None
+        for key, (name, data) in zip(keys, jobs):
+            if key in self.entries or key in self.duplicates: continue
+            if key[1:] in self.recent:
+                self.entries[key] = {"outcome": rename_outcome(self.recent[key[1:]], name), "result_cache": "reused"}
+                continue
+            if make_cache is not None and cache is None: cache = make_cache()
+            cache_key = cache.key(data, early_exit) if cache is not None else None
+            outcome = cache.get(cache_key, name) if cache is not None else None
+            if outcome is not None:
+                self.entries[key] = {"outcome": outcome, "result_cache": "hit"}
+            else:
+                new.append((key, name, data, cache_key))
+        if new:
+            now = time.perf_counter()
+            futures = []
+            for key, _, _, _ in new:
+                entry = {"future": Future(), "submitted": now, "result_cache": "miss" if cache is not None else None}
+                entry["future"].add_done_callback(lambda _, entry=entry: entry.setdefault("finished", time.perf_counter()))
+                self.entries[key] = entry
+                futures.append(entry["future"])
+            self.executor.submit(self._run, [(name, data) for _, name, data, _ in new], futures,
+                                 [cache_key for _, _, _, cache_key in new], cache, workers, early_exit,
+                                 timeout, memory_mb, self._cancel)
+        return keys
+
+    @staticmethod
+    def _run(jobs, futures, cache_keys, cache, workers, early_exit, timeout, memory_mb, cancel):
+        """背景執行緒：依完成先後填入各檔的 Future，並寫入結果快取 ("skipped" 不寫入，下次重新解析)"""
+        try:
+            for idx, outcome in iter_parse_files(jobs, workers, early_exit, timeout, memory_mb, cancel):
+                if cache is not None: cache.put(cache_keys[idx], outcome[0], outcome[1])
+                futures[idx].set_result(outcome)
+        except Exception as e: # 背景工作本身失敗 (parse_pdf_file 內的錯誤已轉為 "error" 狀態)
+            for future in futures:
+                if not future.done(): future.set_result(("error", str(e), {}))
+
+    def outcome(self, key):
+        """已完成時回傳 (狀態, 內容, 計數)，尚在解析中回傳 None"""
+        if key in self.duplicates: return "duplicate", self.duplicates[key], {}
+        entry = self.entries[key]
+        if "outcome" in entry: return entry["outcome"]
+        return entry["future"].result() if entry["future"].done() else None
+
+    def done(self, keys):
+        """已完成解析的檔案數"""
+        return sum(1 for k in keys if self.outcome(k) is not None)
+
+    def progress(self, keys):
+        """(完成數, 總數, 已耗時秒數, 預估剩餘秒數 或 None)；耗時由本批次最早提交的檔案起算，結果快取命中的檔案不計"""
+        parsed = [self.entries[k] for k in keys if k in self.entries and "future" in self.entries[k]]
+        done = self.done(keys)
+        if not parsed: return done, len(keys), 0.0, 0.0
+        start = min(e["submitted"] for e in parsed)
+        finished = [e["finished"] for e in parsed if "finished" in e]
+        now = time.perf_counter() if len(finished) < len(parsed) else max(finished)
+        elapsed = now - start
+        remaining = len(parsed) - len(finished)
+        eta = elapsed / len(finished) * remaining if finished else None
+        return done, len(keys), elapsed, eta
+
+    def collect(self, keys):
+        """等待並回傳各檔的 (狀態, 內容, 計數)"""
+        return [self.outcome(k) if k in self.duplicates or "outcome" in self.entries[k] else self.entries[k]["future"].result()
+                for k in keys]
+
+    def cancel(self):
+        """取消所有已提交但尚未完成的檔案"""
+        self._cancel.set()
+        self._cancel = threading.Event()
+
+    def cache_flags(self, keys):
+        flags = ["duplicate" if k in self.duplicates else self.entries[k]["result_cache"] for k in keys]
+        return None if None in flags else flags
+
+    def clear(self):
+        self.cancel()
+        self.entries.clear()
+        self.duplicates.clear()
+        self.recent.clear()
+
+# =============================================================================
+# 9.3 版面中間檔 (artifact)：保存各頁文字與表格，調整規則後不需重新解析 PDF
+# =============================================================================
+
+# 設定目錄後，parse_pdf_file 一律經由中間檔解析：目錄中已有該 PDF (內容雜湊) 的中間檔即直接讀取，否則擷取後寫入
+# 中間檔只保存與規則無關的內容 (文字、字元數、框線範圍內的表格、字元層串流)，標記詞等規則在讀取時才套用
+ARTIFACT_DIR = os.environ.get("REPORT_ARTIFACT_DIR") or None
+ARTIFACT_VERSION = 1 # 變更 build_artifact 的擷取內容時遞增，舊中間檔自動重建
+
+class ArtifactDoc:
+    """以中間檔取代 PDF 的頁面來源，介面與 PageCache 相同 (引擎不需修改)；表格頁預分類的標記詞檢查在此套用"""
+    def __init__(self, artifact, timer=None):
+        self.pages = artifact["pages"]
+        self.timer = timer or StageTimer()
+        self.page_count = len(self.pages)
+        self.streaming = False
+        self.prefetch_tables = True
+        self._table_seen = set()
+        self.counters = {"text_hits": 0, "text_misses": 0, "table_hits": 0, "table_misses": 0,
+                         "table_pages": 0, "table_skip_no_edges": 0, "table_skip_no_markers": 0, "table_pages_cropped": 0,
+                         "table_ms": 0.0, "pages_released": 0, "template_hits": 0, "template_misses": 0}
+
+    def text(self, i):
+        self.counters["text_hits"] += 1
+        return self.pages[i]["text"]
+
+    def marker_text(self, i):
+        return self.pages[i]["text"]
+
+    def char_count(self, i, limit=None):
+        return self.pages[i]["chars"]
+
+    def tables(self, i):
+        page = self.pages[i]
+        first = i not in self._table_seen
+        self._table_seen.add(i)
+        self.counters["table_misses" if first else "table_hits"] += 1
+        if page["tables"] is None:
+            if first: self.counters["table_skip_no_edges"] += 1
+            return []
+        if TABLE_PAGE_FILTER and not has_table_markers(page["stream"]):
+            if first: self.counters["table_skip_no_markers"] += 1
+            return []
+        if first: self.counters["table_pages"] += 1
+        return page["tables"]
+
+    def close(self):
+        pass
+
+def build_artifact(data):
+    """擷取每頁的文字、字元數與表格 (不套用標記詞略過，規則變更後仍可使用)；每頁擷取後即釋放版面物件"""
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        doc = PageCache(pdf, streaming=False, text_backend=PdfiumText(data) if TEXT_BACKEND == "pdfium" else None)
+        try:
+            pages = []
+            for i in range(doc.page_count):
+                page = pdf.pages[i]
+                entry = {"text": doc.text(i), "chars": PageCache._count_chars(page), "tables": None, "stream": ""}
+                if page.edges:
+                    doc._extract_tables(i, markers=False)
+                    entry["tables"] = doc._tables.pop(i)
+                    entry["stream"] = re.sub(r"\s+", "", "".join(c["text"] for c in page.chars))
+                page.close()
+                pages.append(entry)
+        finally:
+            doc.close()
+    return {"version": ARTIFACT_VERSION, "text_backend": TEXT_BACKEND, "pages": pages}
+
+def artifact_path(data, directory=None):
+    return os.path.join(directory or ARTIFACT_DIR, hashlib.sha256(data).hexdigest() + ".json.gz")
+
+def save_artifact(path, artifact):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as fh:
+        fh.write(gzip.compress(json.dumps(artifact, ensure_ascii=False, separators=(",", ":")).encode("utf-8")))
+    os.replace(tmp_path, path)
+
+def load_artifact(path):
+    """讀取中間檔；不存在、損毀或版本 / 文字後端不符時回傳 None"""
+    try:
+        with open(path, "rb") as fh:
+            artifact = json.loads(gzip.decompress(fh.read()))
+    except (OSError, EOFError, ValueError):
+        return None
+    if artifact.get("version") != ARTIFACT_VERSION or artifact.get("text_backend") != TEXT_BACKEND: return None
+    return artifact
+
+def parse_artifact(filename, data, early_exit=False, directory=None):
+    """經由中間檔解析單一 PDF，回傳格式與 parse_pdf_file 相同；計數另含 artifact ("hit" / "built")"""
+    timer = StageTimer()
+    counters = {"stage_ms": timer.ms}
+    try:
+        path = artifact_path(data, directory)
+        with timer.stage("artifact"):
+            artifact = load_artifact(path)
+            state = "hit"
+            if artifact is None:
+                artifact = build_artifact(data)
+                save_artifact(path, artifact)
+                state = "built"
+        doc = ArtifactDoc(artifact, timer)
+        counters = doc.counters
+        counters["stage_ms"] = timer.ms
+        counters["artifact"] = state
+        status, payload = parse_doc(filename, doc, early_exit)
+        return status, payload, counters
+    except MemoryError:
+        return "skipped", "記憶體超過上限", counters
+    except Exception as e:
+        return "error", str(e), counters
+
+# =============================================================================
+# 9.4 匯出 (Excel / CSV / Parquet)：只在下載時產生，依結果版本快取
+# =============================================================================
+
+EXPORT_WRITE_ONLY_ROWS = 1000 # 達此列數的 Excel 以 openpyxl 唯寫模式逐列寫出 (不建立整張工作表物件，不套用表頭格式)
+EXPORT_STEM = "SGS_CTI_Intertek_Summary_v63.48"
+PARQUET_AVAILABLE = importlib.util.find_spec("pyarrow") is not None # pandas.to_parquet 的引擎；未安裝時不提供 Parquet (不在啟動時匯入)
+EXPORT_FORMATS = {
+    "xlsx": ("📥 下載 Excel", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("📥 下載 CSV", "text/csv"),
+}
+if PARQUET_AVAILABLE:
+    EXPORT_FORMATS["parquet"] = ("📥 下載 Parquet", "application/octet-stream")
+
+def results_frame(rows):
+    """總表 DataFrame (依 DISPLAY_COLUMNS 排列，缺少的欄位補空字串)"""
+    df = pd.DataFrame(rows)
+    for col in DISPLAY_COLUMNS:
+        if col not in df.columns:
+            df[col] = ""
+    return df[DISPLAY_COLUMNS]
+
+def export_results(rows, fmt):
+    """將總表列輸出為指定格式的位元組"""
+    if fmt == "xlsx" and len(rows) >= EXPORT_WRITE_ONLY_ROWS:
+        from openpyxl import Workbook
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Summary")
+        ws.append(DISPLAY_COLUMNS)
+        for row in rows:
+            ws.append([row.get(c, "") for c in DISPLAY_COLUMNS])
+        output = io.BytesIO()
+        wb.save(output)
+        return output.getvalue()
+    df = results_frame(rows)
+    if fmt == "xlsx":
+        output = io.BytesIO()
+        with pd.ExcelWriter(output, engine='openpyxl') as writer:
+            df.to_excel(writer, index=False, sheet_name='Summary')
+        return output.getvalue()
+    if fmt == "csv":
+        return df.to_csv(index=False).encode("utf-8-sig") # 含 BOM，Excel 開啟中文不亂碼
+    if fmt == "parquet":
+        if not PARQUET_AVAILABLE: raise ValueError("Parquet 匯出需要安裝 pyarrow (pip install pyarrow)")
+        df = df.astype({c: str for c in DISPLAY_COLUMNS if c != "ITEM"}) # 數值欄含 "N.D." 等文字，統一為字串欄
+        return df.to_parquet(index=False)
+    raise ValueError(f"不支援的匯出格式：{fmt}")
+
+def cached_export(store, version, rows, fmt):
+    """store: 同一工作階段共用的 dict；結果版本變更時捨棄舊的匯出內容"""
+    if store.get("version") != version:
+        store.clear()
+        store["version"] = version
+    if fmt not in store:
+        store[fmt] = export_results(rows, fmt)
+    return store[fmt]
+
+# =============================================================================
+# 9.5 歷史資料庫 (SQLite)：保存每個 ITEM 的整合列與各檔擷取結果，查詢歷史數據不需重新開啟 PDF
+# =============================================================================
+
+HISTORY_DB_PATH = os.environ.get("REPORT_HISTORY_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".history.sqlite3"))
+HISTORY_ANALYTES = [c for c in DISPLAY_COLUMNS if c not in ("ITEM", "Date", "File Name")] # 以顯示欄名保存
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY, saved_at TEXT NOT NULL, source TEXT NOT NULL, item INTEGER, date TEXT, file_name TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY, item_id INTEGER REFERENCES items(id) ON DELETE CASCADE, saved_at TEXT NOT NULL,
+    file_hash TEXT NOT NULL, file_name TEXT NOT NULL, status TEXT NOT NULL, company TEXT, engine TEXT, date TEXT
+);
+CREATE TABLE IF NOT EXISTS item_values (
+    item_id INTEGER NOT NULL REFERENCES items(id) ON DELETE CASCADE, analyte TEXT NOT NULL, value TEXT NOT NULL,
+    score_type INTEGER NOT NULL, score_value REAL NOT NULL, PRIMARY KEY (item_id, analyte)
+);
+CREATE TABLE IF NOT EXISTS file_values (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE, analyte TEXT NOT NULL, value TEXT NOT NULL,
+    score_type INTEGER NOT NULL, score_value REAL NOT NULL, PRIMARY KEY (file_id, analyte)
+);
+CREATE INDEX IF NOT EXISTS items_date ON items(date);
+CREATE INDEX IF NOT EXISTS items_file_name ON items(file_name);
+CREATE INDEX IF NOT EXISTS files_item ON files(item_id);
+CREATE INDEX IF NOT EXISTS files_hash ON files(file_hash);
+CREATE INDEX IF NOT EXISTS files_file_name ON files(file_name);
+CREATE INDEX IF NOT EXISTS files_date ON files(date);
+CREATE INDEX IF NOT EXISTS files_company ON files(company, date);
+CREATE INDEX IF NOT EXISTS item_values_value ON item_values(analyte, score_type, score_value);
+CREATE INDEX IF NOT EXISTS file_values_value ON file_values(analyte, score_type, score_value);
+"""
+
+def history_records(names, hashes, outcomes):
+    """由各檔的 (狀態, 內容, 計數) 整理為 ResultStore.add_item 的單檔紀錄；錯誤 / 略過的檔案不保存 (與結果快取相同)"""
+    return [(name, file_hash, status, payload) for name, file_hash, (status, payload, _) in zip(names, hashes, outcomes)
+            if status in ("ok", "unreadable")]
+
+class ResultStore:
+    """SQLite 歷史資料庫；每次操作各自連線，可在 Streamlit 的不同執行緒 / 命令列父行程中使用
+    數值以 (值文字, get_value_score 的類型, 數值) 保存，分析物 + 類型 + 數值有索引，「Pb >= 100」之類的條件直接走索引
+    日期以 YYYY-MM-DD 保存 (無日期為 NULL)，可直接比較大小
+    """
+    def __init__(self, path=HISTORY_DB_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.executescript(HISTORY_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """一次操作的連線：區塊內為單一交易 (正常結束時 commit、例外時 rollback)，結束後一律關閉連線
+        (sqlite3 連線本身的 with 只處理交易、不會關閉)
+        """
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA foreign_keys = ON")
+            conn.execute("PRAGMA journal_mode = WAL") # 查詢與寫入互不阻塞
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _values(values):
+        """{顯示欄名: 值} -> [(分析物, 值, 類型, 數值)]，空值不保存"""
+        rows = []
+        for analyte in HISTORY_ANALYTES:
+            value = str(values.get(analyte, "") or "")
+            if value:
+                score_type, score_value = get_value_score(value)
+                rows.append((analyte, value, score_type, score_value))
+        return rows
+
+    def add_item(self, row, records, source=""):
+        """保存一個 ITEM：row 為整合列 (可為 None，例如全數為掃描檔)，records 為 history_records 的單檔紀錄
+        source: 來源標記 (命令列為子目錄 / 清單項目名稱)；回傳 ITEM 的資料庫 id (row 為 None 時為 None)
+        """
+        saved_at = datetime.now().isoformat(timespec="seconds")
+        with self._connect() as conn:
+            item_id = None
+            if row:
+                item_id = conn.execute("INSERT INTO items (saved_at, source, item, date, file_name) VALUES (?, ?, ?, ?, ?)",
+                                       (saved_at, source, row.get("ITEM"), row.get("Date", "").replace("/", "-") or None,
+                                        row.get("File Name", ""))).lastrowid
+                conn.executemany("INSERT INTO item_values VALUES (?, ?, ?, ?, ?)",
+                                 [(item_id, *v) for v in self._values(row)])
+            for name, file_hash, status, payload in records:
+                result = payload.to_dict() if status == "ok" else {}
+                date_obj = result.get("DateObj", datetime.min)
+                file_id = conn.execute(
+                    "INSERT INTO files (item_id, saved_at, file_hash, file_name, status, company, engine, date) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (item_id, saved_at, file_hash, name, status, result.get("Company"), result.get("Engine"),
+                     date_obj.date().isoformat() if date_obj > datetime.min else None)).lastrowid
+                values = {COLUMN_MAPPING.get(k, k): v for k, v in result.items()}
+                conn.executemany("INSERT INTO file_values VALUES (?, ?, ?, ?, ?)",
+                                 [(file_id, *v) for v in self._values(values)])
+        return item_id
+
+    def companies(self):
+        with self._connect() as conn:
+            return [r[0] for r in conn.execute("SELECT DISTINCT company FROM files WHERE company IS NOT NULL ORDER BY company")]
+
+    def search(self, kind="files", analyte=None, min_value=None, max_value=None, since=None, until=None, company=None,
+               file_name=None, limit=1000):
+        """查詢歷史資料，回傳 dict 列表 (新到舊)
+        kind: "files" = 單檔擷取結果，"items" = ITEM 整合列 (欄位與總表相同，另加 Saved / Source)
+        analyte: 顯示欄名 (如 "Pb")；搭配 min_value / max_value 時只比對數值結果，否則比對任何非空結果
+        since / until: 報告日期範圍 (含)，可為 date / datetime 或 "YYYY-MM-DD"
+        company: 實驗室 (identify_company 的結果)；ITEM 查詢時比對其任一單檔
+        file_name: 檔名開頭 (走索引的範圍查詢)
+        """
+        table, values_table, key = ("files", "file_values", "file_id") if kind == "files" else ("items", "item_values", "item_id")
+        joins, where, params = [], [], []
+        if analyte:
+            joins.append(f"JOIN {values_table} v ON v.{key} = t.id AND v.analyte = ?")
+            params.append(analyte)
+            if min_value is not None or max_value is not None:
+                where.append("v.score_type = 3")
+                if min_value is not None:
+                    where.append("v.score_value >= ?")
+                    params.append(float(min_value))
+                if max_value is not None:
+                    where.append("v.score_value <= ?")
+                    params.append(float(max_value))
+        if kind == "files":
+            where.append("t.status = 'ok'")
+        if since:
+            where.append("t.date >= ?")
+            params.append(since if isinstance(since, str) else since.strftime("%Y-%m-%d"))
+        if until:
+            where.append("t.date <= ?")
+            params.append(until if isinstance(until, str) else until.strftime("%Y-%m-%d"))
+        if company:
+            if kind == "files":
+                where.append("t.company = ?")
+            else:
+                where.append("EXISTS (SELECT 1 FROM files f WHERE f.item_id = t.id AND f.company = ?)")
+            params.append(company)
+        if file_name:
+            where.append("t.file_name >= ? AND t.file_name < ?")
+            params += [file_name, file_name + "\U0010ffff"]
+        columns = ("t.id, t.saved_at, t.file_name, t.date, t.file_hash, t.company, t.engine" if kind == "files"
+                   else "t.id, t.saved_at, t.file_name, t.date, t.source, t.item")
+        sql = (f"SELECT {columns} FROM {table} t {' '.join(joins)}" + (f" WHERE {' AND '.join(where)}" if where else "")
+               + " ORDER BY t.date IS NULL, t.date DESC, t.id DESC LIMIT ?")
+        with self._connect() as conn:
+            found = conn.execute(sql, params + [int(limit)]).fetchall()
+            values = {}
+            ids = [r[0] for r in found]
+            for start in range(0, len(ids), 500): # SQLite 參數數量上限
+                chunk = ids[start:start + 500]
+                for owner, analyte_name, value in conn.execute(
+                        f"SELECT {key}, analyte, value FROM {values_table} WHERE {key} IN ({','.join('?' * len(chunk))})", chunk):
+                    values.setdefault(owner, {})[analyte_name] = value
+        rows = []
+        for r in found:
+            if kind == "files":
+                row = {"File Name": r[2], "Date": (r[3] or "").replace("-", "/"), "Company": r[5] or "", "Engine": r[6] or "",
+                       "Saved": r[1], "SHA-256": r[4]}
+            else:
+                row = {"ITEM": r[5], "Date": (r[3] or "").replace("-", "/"), "File Name": r[2], "Saved": r[1], "Source": r[4]}
+            row.update({a: values.get(r[0], {}).get(a, "") for a in HISTORY_ANALYTES})
+            rows.append(row)
+        return rows
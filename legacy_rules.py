@@ -0,0 +1,150 @@
+"""v63.43 逐詞子字串判定的凍結副本 (供 benchmark.py rules-diff 與編譯規則做差異比對)
+
+關鍵字表與各引擎的判定條件照搬 rules.json 導入前的 app.py，請勿隨規則檔修改；
+若刻意變更判定行為，rules-diff 會列出差異，確認後再同步修改此處
+"""
+
+SIMPLE_KEYWORDS = {
+    "Pb": ["Lead", "鉛", "铅", "Pb", "납"],
+    "Cd": ["Cadmium", "鎘", "镉", "Cd", "카드뮴"],
+    "Hg": ["Mercury", "汞", "Hg", "수은"],
+    "Cr6+": ["Hexavalent Chromium", "六價鉻", "六价铬", "Cr(VI)", "Chromium VI", "6가 크롬"],
+    "DEHP": ["DEHP", "Di(2-ethylhexyl) phthalate", "Bis(2-ethylhexyl) phthalate", "邻苯二甲酸二(2-乙基己基)酯"],
+    "BBP": ["BBP", "Butyl benzyl phthalate", "邻苯二甲酸丁苄酯"],
+    "DBP": ["DBP", "Dibutyl phthalate", "邻苯二甲酸二丁酯"],
+    "DIBP": ["DIBP", "Diisobutyl phthalate", "邻苯二甲酸二异丁酯"],
+    "PFOS": ["Perfluorooctane sulfonates", "Perfluorooctane sulfonate", "Perfluorooctane sulfonic acid", "全氟辛烷磺酸", "Perfluorooctane Sulfonamide", "PFOS and its salts", "PFOS 及其盐", "PFOS"],
+    "F": ["Fluorine", "氟", "불소"],
+    "CL": ["Chlorine", "氯", "염소"],
+    "BR": ["Bromine", "溴", "브롬"],
+    "I": ["Iodine", "碘", "lodine", "요오드"]
+}
+
+GROUP_KEYWORDS = {
+    "PBB": [
+        "Polybrominated Biphenyls", "PBBs", "Sum of PBBs",
+        "多溴聯苯總和", "多溴聯苯之和", "多溴联苯总和", "多溴联苯之和", "多溴联苯", "폴리브롬화비페닐",
+        "Polybromobiphenyl", "Monobromobiphenyl", "Dibromobiphenyl", "Tribromobiphenyl",
+        "Tetrabromobiphenyl", "Pentabromobiphenyl", "Hexabromobiphenyl",
+        "Heptabromobiphenyl", "Octabromobiphenyl", "Nonabromobiphenyl",
+        "Decabromobiphenyl", "Monobrominated", "Dibrominated", "Tribrominated",
+        "Tetrabrominated", "Pentabrominated", "Hexabrominated", "Heptabrominated",
+        "Octabrominated", "Nonabrominated", "Decabrominated",
+        "MonoBB", "DiBB", "TriBB", "TetraBB", "PentaBB", "HexaBB", "HeptaBB", "OctaBB", "NonaBB", "DecaBB"
+    ],
+    "PBDE": [
+        "Polybrominated Diphenyl Ethers", "PBDEs", "Sum of PBDEs",
+        "多溴聯苯醚總和", "多溴二苯醚之和", "多溴二苯醚總和", "多溴二苯醚", "폴리브롬화디페닐에테르",
+        "Polybromodiphenyl ether", "Monobromodiphenyl ether", "Dibromodiphenyl ether", "Tribromodiphenyl ether",
+        "Tetrabromodiphenyl ether", "Pentabromodiphenyl ether", "Hexabromodiphenyl ether",
+        "Heptabromodiphenyl ether", "Octabromodiphenyl ether", "Nonabromodiphenyl ether",
+        "Decabromodiphenyl ether", "Monobrominated Diphenyl", "Dibrominated Diphenyl", "Tribrominated Diphenyl",
+        "Tetrabrominated Diphenyl", "Pentabrominated Diphenyl", "Hexabrominated Diphenyl",
+        "Heptabrominated Diphenyl", "Octabrominated Diphenyl", "Nonabrominated Diphenyl",
+        "Decabrominated Diphenyl",
+        "MonoBDE", "DiBDE", "TriBDE", "TetraBDE", "PentaBDE", "HexaBDE", "HeptaBDE", "OctaBDE", "NonaBDE", "DecaBDE"
+    ]
+}
+
+MSDS_HEADER_KEYWORDS = ["content", "composition", "concentration", "含量", "成分"]
+
+BROMO_COMPOUNDS = ["polybromo", "hexabromo", "monobromo", "dibromo", "tribromo", "tetrabromo", "pentabromo", "heptabromo", "octabromo", "nonabromo", "decabromo", "multibromo", "pbb", "pbde", "多溴", "六溴", "一溴", "二溴", "三溴", "四溴", "五溴", "七溴", "八溴", "九溴", "十溴", "二苯醚"]
+FLUORO_COMPOUNDS = ["perfluoro", "polyfluoro", "pfos", "pfoa", "全氟"]
+BROMINATED_FLAME_RETARDANTS = ["pbb", "pbde", "polybrominated", "多溴"]
+
+
+def _first_group(text):
+    for key, kws in GROUP_KEYWORDS.items():
+        if any(kw.lower() in text for kw in kws): return [key]
+    return []
+
+
+def standard(text):
+    """process_standard_engine：整列含 pvc 略過；命中的 simple 全部計入 (舊版同一分析物可重複 append，此處去重)，group 亦全部計入"""
+    if "pvc" in text: return [], []
+    simple = []
+    for target_key, keywords in SIMPLE_KEYWORDS.items():
+        if target_key == "Cd" and any(bad in text for bad in ["hbcdd", "cyclododecane", "ecd", "indeno"]): continue
+        if target_key == "F" and any(bad in text for bad in FLUORO_COMPOUNDS): continue
+        if target_key == "BR" and ("halogen" in text or "bromine" in text): pass
+        else:
+            if target_key == "BR" and any(bad in text for bad in BROMO_COMPOUNDS): continue
+        if target_key == "Pb" and any(bad in text for bad in BROMINATED_FLAME_RETARDANTS): continue
+        if target_key == "BBP" and ("tbbp" in text or "tetrabromo" in text): continue
+        for kw in keywords:
+            if kw.lower() in text:
+                if target_key == "PFOS" and "related" in text: continue
+                if target_key not in simple: simple.append(target_key)
+    group = [key for key, kws in GROUP_KEYWORDS.items() if any(kw.lower() in text for kw in kws)]
+    return simple, group
+
+
+def cti(text):
+    """process_cti_engine：含 tbbp 整列略過；simple 與 group 各取第一個"""
+    if "tbbp" in text or "tetrabromo" in text: return [], []
+    simple = []
+    for key, kws in SIMPLE_KEYWORDS.items():
+        if key == "BR" and ("halogen" in text or "bromine" in text): pass
+        else:
+            if key == "Cd" and any(bad in text for bad in ["hbcdd", "cyclododecane", "ecd"]): continue
+            if key == "F" and any(bad in text for bad in FLUORO_COMPOUNDS): continue
+            if key == "BR" and any(bad in text for bad in BROMO_COMPOUNDS): continue
+            if key == "Pb" and any(bad in text for bad in BROMINATED_FLAME_RETARDANTS): continue
+        if any(kw.lower() in text for kw in kws):
+            simple = [key]
+            break
+    return simple, _first_group(text)
+
+
+def text_rescue(text, targets=None):
+    """parse_text_lines_v60：MSDS 表頭略過；simple 取第一個 (含 test item 時不判定)，未命中才取第一個 group"""
+    if any(bad in text for bad in MSDS_HEADER_KEYWORDS): return [], []
+    matched_simple = None
+    for key, keywords in SIMPLE_KEYWORDS.items():
+        if targets and key not in targets: continue
+        if key == "BBP" and ("tbbp" in text or "tetrabromo" in text): continue
+        if key == "BR" and ("halogen" in text or "bromine" in text): pass
+        else:
+            if key == "Cd" and any(bad in text for bad in ["hbcdd", "cyclododecane", "ecd", "indeno"]): continue
+            if key == "F" and any(bad in text for bad in FLUORO_COMPOUNDS): continue
+            if key == "BR" and any(bad in text for bad in BROMO_COMPOUNDS): continue
+            if key == "Pb" and any(bad in text for bad in BROMINATED_FLAME_RETARDANTS): continue
+        for kw in keywords:
+            if kw.lower() in text and "test item" not in text:
+                matched_simple = key
+                break
+        if matched_simple: break
+    if matched_simple: return [matched_simple], []
+    for group_key, keywords in GROUP_KEYWORDS.items():
+        if targets and group_key not in targets: continue
+        if any(kw.lower() in text for kw in keywords): return [], [group_key]
+    return [], []
+
+
+def intertek(text):
+    """process_intertek_engine：含 pvc / polyvinyl 不判定氯；simple 與 group 各取第一個"""
+    simple = []
+    for key, kws in SIMPLE_KEYWORDS.items():
+        if key == "CL" and ("pvc" in text or "polyvinyl" in text): continue
+        if any(kw.lower() in text for kw in kws):
+            simple = [key]
+            break
+    return simple, _first_group(text)
+
+
+def halogen_block(text):
+    """process_halogen_block：鹵素表格列依 氟 → 氯 → 溴 → 碘 的順序取第一個"""
+    if "fluorine" in text: return ["F"], []
+    if "chlorine" in text: return ["CL"], []
+    if "bromine" in text: return ["BR"], []
+    if "iodine" in text or "lodine" in text: return ["I"], []
+    return [], []
+
+
+PROFILES = {
+    "standard": standard,
+    "cti": cti,
+    "text": text_rescue,
+    "intertek": intertek,
+    "halogen_block": halogen_block,
+}
@@ -0,0 +1,260 @@
+"""合成測試報告 PDF (不需外部檔案，供效能量測與回歸比對)
+
+以最小的 PDF 寫入器 (Helvetica 文字 + 矩形框線表格) 組出各引擎路由的代表性報告：
+SGS 標準、SGS 文字救援、SGS 馬來西亞、CTI、Intertek、鹵素區塊，以及無文字層的掃描檔
+"""
+import zlib
+
+
+def _esc(s):
+    return s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+class Page:
+    """單頁內容串流：逐行由上往下排版"""
+    def __init__(self, w=595, h=842):
+        self.w, self.h = w, h
+        self.ops = []
+        self.y = h - 60
+
+    def text(self, x, y, s, size=9):
+        self.ops.append(f"BT /F1 {size} Tf {x:.1f} {y:.1f} Td ({_esc(s)}) Tj ET")
+
+    def line(self, s, size=9, x=50, gap=13):
+        self.text(x, self.y, s, size)
+        self.y -= gap
+
+    def para(self, lines):
+        for l in lines:
+            self.line(l)
+
+    def table(self, rows, widths, row_h=16, x0=50):
+        """每個儲存格畫一個矩形框 (pdfplumber lines 策略可辨識)"""
+        top = self.y
+        for r, row in enumerate(rows):
+            x = x0
+            y = top - (r + 1) * row_h
+            for c, w in enumerate(widths):
+                self.ops.append(f"{x:.1f} {y:.1f} {w:.1f} {row_h:.1f} re S")
+                cell = row[c] if c < len(row) else ""
+                if cell:
+                    self.text(x + 3, y + 5, cell, 8)
+                x += w
+        self.y = top - len(rows) * row_h - 20
+
+
+def build_pdf(pages):
+    objs = []
+
+    def add(b):
+        objs.append(b)
+        return len(objs)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    pages_id = len(objs) + 1 + 2 * len(pages)
+    kids = []
+    for p in pages:
+        data = zlib.compress("\n".join(p.ops).encode("latin-1"))
+        cid = add(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(data) + data + b"\nendstream")
+        kids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (pages_id, p.w, p.h, cid, font)))
+    add(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), len(kids)))
+    root = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, o in enumerate(objs, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + o + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objs) + 1, root, xref)
+    return bytes(out)
+
+
+DISCLAIMER = [
+    "This document is issued by the Company subject to its General Conditions of Service printed",
+    "overleaf, available on request or accessible at the website. Attention is drawn to the",
+    "limitation of liability, indemnification and jurisdiction issues defined therein. Any holder",
+    "of this document is advised that information contained hereon reflects the Company's findings",
+    "at the time of its intervention only and within the limits of Client's instructions, if any.",
+    "The Company's sole responsibility is to its Client and this document does not exonerate",
+    "parties to a transaction from exercising all their rights and obligations under the transaction",
+    "documents. Any unauthorized alteration, forgery or falsification of the content or appearance",
+]
+
+SGS_RESULT_HEADER = ["Test Item(s)", "Unit", "Method", "MDL", "Result No.1"]
+SGS_WIDTHS = [170, 50, 90, 40, 70]
+
+
+def filler(n, lab="SGS"):
+    """免責聲明頁 (無框線、無分析物)"""
+    out = []
+    for i in range(n):
+        p = Page()
+        p.line(f"{lab} Test Report - continued page {i + 1}", 11)
+        for _ in range(6):
+            p.para(DISCLAIMER)
+        out.append(p)
+    return out
+
+
+def sgs_standard(pb="15", cd="n.d.", date="Jan 05 2024", extra_pages=3, halogen=True, pfos=True, pb_sum="n.d."):
+    p1 = Page()
+    p1.line("SGS Taiwan Ltd. Test Report", 14)
+    p1.line("Report No. : CE/2024/10001   Date : " + date)
+    p1.line("Sample Description : PLASTIC HOUSING")
+    p1.line("Date of receipt : Dec 20 2023   Testing period : Dec 20 2023 to Jan 04 2024")
+    p1.line("Test Requested : RoHS 2.0, Halogen, PFOS as specified by client")
+    p1.para(DISCLAIMER)
+    p2 = Page()
+    p2.line("Test Result(s)", 12)
+    p2.table([SGS_RESULT_HEADER,
+              ["Cadmium (Cd)", "mg/kg", "IEC 62321-5", "2", cd],
+              ["Lead (Pb)", "mg/kg", "IEC 62321-5", "2", pb],
+              ["Mercury (Hg)", "mg/kg", "IEC 62321-4", "2", "n.d."],
+              ["Hexavalent Chromium Cr(VI)", "mg/kg", "IEC 62321-7-2", "8", "n.d."],
+              ["Sum of PBBs", "mg/kg", "IEC 62321-6", "-", pb_sum],
+              ["Monobromobiphenyl", "mg/kg", "IEC 62321-6", "5", "n.d."],
+              ["Decabromobiphenyl", "mg/kg", "IEC 62321-6", "5", "n.d."],
+              ["Sum of PBDEs", "mg/kg", "IEC 62321-6", "-", "n.d."],
+              ["Monobromodiphenyl ether", "mg/kg", "IEC 62321-6", "5", "n.d."],
+              ["Decabromodiphenyl ether", "mg/kg", "IEC 62321-6", "5", "7"],
+              ["Dibutyl phthalate (DBP)", "mg/kg", "IEC 62321-8", "50", "n.d."],
+              ["Butyl benzyl phthalate (BBP)", "mg/kg", "IEC 62321-8", "50", "n.d."],
+              ["Di(2-ethylhexyl) phthalate (DEHP)", "mg/kg", "IEC 62321-8", "50", "120"],
+              ["Diisobutyl phthalate (DIBP)", "mg/kg", "IEC 62321-8", "50", "n.d."]], SGS_WIDTHS)
+    pages = [p1, p2]
+    if halogen:
+        p3 = Page()
+        p3.line("Halogen", 12)
+        p3.table([SGS_RESULT_HEADER,
+                  ["Halogen", "", "", "", ""],
+                  ["Fluorine (F)", "mg/kg", "EN 14582", "50", "n.d."],
+                  ["Chlorine (Cl)", "mg/kg", "EN 14582", "50", "312"],
+                  ["Bromine (Br)", "mg/kg", "EN 14582", "50", "n.d."],
+                  ["Iodine (I)", "mg/kg", "EN 14582", "50", "n.d."]], SGS_WIDTHS)
+        pages.append(p3)
+    if pfos:
+        p4 = Page()
+        p4.line("PFOS", 12)
+        p4.table([SGS_RESULT_HEADER,
+                  ["Perfluorooctane sulfonates (PFOS)", "ug/m2", "CEN/TS 15968", "0.1", "n.d."],
+                  ["PFOS related substances", "ug/m2", "CEN/TS 15968", "0.1", "n.d."]], SGS_WIDTHS)
+        pages.append(p4)
+    pages.extend(filler(extra_pages))
+    return build_pdf(pages)
+
+
+def sgs_text_rescue():
+    """結果只在文字層 (無表格)，觸發 SGS 文字救援"""
+    p1 = Page()
+    p1.line("SGS Taiwan Ltd. Test Report", 14)
+    p1.line("Report No. : CE/2024/20002   Date : 2024 03 18")
+    p1.line("Halogen and PFOS testing")
+    p2 = Page()
+    p2.line("Test Result(s)")
+    p2.para(["Lead (Pb) mg/kg 2 33", "Cadmium (Cd) mg/kg 2 n.d.", "Fluorine (F) mg/kg 50 n.d.",
+             "Bromine (Br) mg/kg 50 870", "PFOS mg/kg 0.01 n.d.", "Sum of PBBs mg/kg - n.d."])
+    return build_pdf([p1, p2] + filler(1))
+
+
+def sgs_malaysia():
+    p1 = Page()
+    p1.line("SGS (Malaysia) Sdn Bhd", 14)
+    p1.line("Lot 18, Jalan Industri, 47100 Puchong, Selangor, MALAYSIA")
+    p1.line("TEST REPORT REPORTED DATE : 12 March 2024")
+    p1.line("Results")
+    p1.para(["Lead (Pb) mg/kg 2 N.D.", "Cadmium (Cd) mg/kg 2 5", "Mercury (Hg) mg/kg 2 N.D.",
+             "Hexavalent Chromium mg/kg 8 N.D.", "Sum of PBBs mg/kg N.D.", "Sum of PBDEs mg/kg 12",
+             "Di(2-ethylhexyl) phthalate (DEHP)", "CAS No. 117-81-7", "mg/kg 50 N.D.", "",
+             "Benzyl butyl phthalate (BBP) mg/kg 50 N.D.", "Dibutyl phthalate (DBP) mg/kg 50 64",
+             "Diisobutyl phthalate (DIBP) mg/kg 50 N.D.", "Fluorine mg/kg 50 N.D.",
+             "Chlorine mg/kg 50 120", "Bromine mg/kg 50 N.D.", "Iodine mg/kg 50 N.D.",
+             "PFOS ug/m2 NEGATIVE"])
+    return build_pdf([p1] + filler(2))
+
+
+def cti(pb="9.5", extra_pages=2):
+    p1 = Page()
+    p1.line("Centre Testing International Group Co., Ltd. (CTI)", 13)
+    p1.line("Report No. A2230012345101   Date: Apr 02 2024")
+    p1.line("Sample received: Mar 20 2024")
+    p2 = Page()
+    p2.line("Test Results")
+    p2.table([["Test Item", "Result", "MDL", "Limit"],
+              ["Lead (Pb)", pb, "2", "1000"],
+              ["Cadmium (Cd)", "N.D.", "2", "100"],
+              ["Mercury (Hg)", "N.D.", "2", "1000"],
+              ["Hexavalent Chromium (Cr(VI))", "N.D.", "8", "1000"],
+              ["Sum of PBBs", "N.D.", "-", "1000"],
+              ["Sum of PBDEs", "N.D.", "-", "1000"],
+              ["DEHP", "N.D.", "50", "1000"],
+              ["DBP", "77", "50", "1000"],
+              ["TBBP-A", "N.D.", "50", "-"]], [170, 70, 50, 60])
+    return build_pdf([p1, p2] + filler(extra_pages, "CTI"))
+
+
+def intertek(extra_pages=3):
+    p1 = Page()
+    p1.line("Intertek Testing Services Taiwan Ltd.", 13)
+    p1.line("Number : TWNC00912345   Issue Date : 15 April 2024")
+    p1.line("Date Received : 02 April 2024   Date Test Started : 03 April 2024")
+    p1.line("Per- and Polyfluoroalkyl Substances screening included")
+    p2 = Page()
+    p2.line("Test Result")
+    p2.table([["Test Item", "Result", "RL", "Unit"],
+              ["Lead (Pb)", "N.D.", "2", "mg/kg"],
+              ["Cadmium (Cd)", "3 (2)", "2", "mg/kg"],
+              ["Mercury (Hg)", "N.D.", "2", "mg/kg"],
+              ["Polybrominated Biphenyls (PBBs)", "", "", ""],
+              ["Monobrominated Biphenyl", "N.D.", "5", "mg/kg"],
+              ["Polybrominated Diphenyl Ethers (PBDEs)", "", "", ""],
+              ["Monobrominated Diphenyl Ether", "N.D.", "5", "mg/kg"],
+              ["Chlorine (Cl)", "400", "50", "mg/kg"],
+              ["PVC Chlorine content", "N.D.", "50", "mg/kg"]], [200, 70, 40, 50])
+    return build_pdf([p1, p2] + filler(extra_pages, "Intertek"))
+
+
+def halogen_block():
+    """鹵素表格沒有標準表頭，需由 process_halogen_block 補抓"""
+    p1 = Page()
+    p1.line("SGS Taiwan Ltd. Test Report", 14)
+    p1.line("Report No. : CE/2024/30003   Date : May 06 2024")
+    p2 = Page()
+    p2.line("Halogen test")
+    p2.table([["Analyte", "Unit", "Limit", "Value"],
+              ["Fluorine", "mg/kg", "50", "n.d."],
+              ["Chlorine", "mg/kg", "50", "88"],
+              ["Bromine", "mg/kg", "50", "n.d."],
+              ["Iodine", "mg/kg", "50", "n.d."]], [150, 60, 60, 60])
+    return build_pdf([p1, p2] + filler(1))
+
+
+def scanned():
+    """只有框線、沒有文字層"""
+    p = Page()
+    p.ops.append("0 0 595 842 re S")
+    return build_pdf([p, Page()])
+
+
+def corpus(long_pages=20):
+    """檔名 → PDF 位元組；long_pages 為長報告的免責聲明頁數 (0 = 不產生長報告)"""
+    out = {
+        "sgs_std.pdf": sgs_standard(),
+        "sgs_std_b.pdf": sgs_standard(pb="22", cd="4", date="Feb 11 2024", extra_pages=1),
+        "sgs_std_nohal.pdf": sgs_standard(pb="n.d.", halogen=False, pfos=False, date="Mar 01 2023"),
+        "sgs_rescue.pdf": sgs_text_rescue(),
+        "sgs_my.pdf": sgs_malaysia(),
+        "cti.pdf": cti(),
+        "cti_b.pdf": cti(pb="22"),
+        "intertek.pdf": intertek(),
+        "halogen.pdf": halogen_block(),
+        "scanned.pdf": scanned(),
+    }
+    if long_pages:
+        out["sgs_long.pdf"] = sgs_standard(extra_pages=long_pages)
+        out["intertek_long.pdf"] = intertek(extra_pages=long_pages)
+    return out